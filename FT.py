@@ -1,317 +1,304 @@
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord import app_commands
+from discord.oggparse import OggStream
 import asyncio
 import pytz
-from datetime import datetime
-import aiohttp
+from datetime import datetime, timedelta
 import re
 import logging
 import os
+import json
+import time
+import hashlib
+import sqlite3
+import socket
+import io
+import bisect
+import contextlib
+import math
+from array import array
+from collections import OrderedDict
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
+from fuel_core import (
+    COUNTRIES, COUNTRY_FLAGS, DATA_DIR, FUEL_TYPES, drift_listeners, fetch_fuel_prices, fx_rates, metrics,
+    pattern_stats, prices_from_dict, prices_to_dict, render_price, setup_logging, start_metrics_server,
+)
 
 # Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+_log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 # === Configuration ===
 TOKEN = os.getenv("DISCORD_TOKEN", "")
-GUILD_ID = 1225075859333845154  # Server ID
-VOICE_CHANNEL_ID = 1262879963183317176  # Voice channel ID
-TEXT_CHANNEL_ID = 1408154723189657661  # Text channel ID
+GUILD_ID = 1225075859333845154  # Default server ID (used when there is no guilds config yet)
+VOICE_CHANNEL_ID = 1262879963183317176  # Default voice channel ID
+TEXT_CHANNEL_ID = 1408154723189657661  # Default text channel ID
+BROADCAST_CONCURRENCY = 25  # Channels posted to at once
+BROADCAST_RATE = 40  # Messages per second across all channels (Discord's global limit is 50)
+
+# Sharding: SHARD_COUNT > 0 runs an AutoShardedBot, SHARD_IDS ("0,1") picks this process's shards
+# out of SHARD_COUNT (required with SHARD_IDS: every process must agree on the total)
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(x) for x in os.getenv("SHARD_IDS", "").split(",") if x.strip()] or None
+if SHARD_IDS and not SHARD_COUNT:
+    raise SystemExit("SHARD_IDS is set without SHARD_COUNT: set SHARD_COUNT to the total number of shards")
+if SHARD_IDS and not all(0 <= shard_id < SHARD_COUNT for shard_id in SHARD_IDS):
+    raise SystemExit(f"SHARD_IDS {SHARD_IDS} must be between 0 and SHARD_COUNT - 1 ({SHARD_COUNT - 1})")
 SOUND_FILE = "sound.mp3"  # Sound file
+FFMPEG_EXECUTABLE = "ffmpeg"  # Used once at startup to transcode SOUND_FILE to Opus
+
+# Local state (scraper caches are configured in fuel_core)
+STATE_DB = os.getenv("STATE_DB", os.path.join(DATA_DIR, "ft.sqlite3"))  # Shared by all bot processes on a host
+LEADER_LEASE = 60  # Scraper leadership expires if not renewed for this long, seconds
+SNAPSHOT_POLL = 5  # How often processes renew leadership and check the snapshot version, seconds
+SNAPSHOT_WAIT = 120  # How long a follower waits for the leader's scheduled refresh, seconds
+HISTORY_DB = os.getenv("HISTORY_DB", os.path.join(DATA_DIR, "history.sqlite3"))  # Every refresh, append-only
+SUBSCRIPTIONS_FILE = os.path.join(DATA_DIR, "subscriptions.json")  # Price alert thresholds
+SUBSCRIPTIONS_PER_USER = 10  # Max price alerts per user
+COMMAND_SYNC_STATE = os.path.join(DATA_DIR, "command_sync.json")  # Hash of the last synced command tree per guild
+GUILDS_CONFIG = os.getenv("GUILDS_CONFIG", os.path.join(DATA_DIR, "guilds.json"))  # Per-guild channels, edited with /setup
+
+# Scheduled jobs (cron syntax: minute hour day-of-month month day-of-week)
+SCHEDULE_TIMEZONE = "Europe/Moscow"
+SCHEDULE = {
+    "refresh": "0 0 * * *",  # Scrape new prices at midnight
+    "broadcast": "0 0 * * *",  # Post prices and play the sound at midnight
+    "warm-cache": "*/30 * * * *",  # Re-render hot embeds evicted from the LRU
+}
+SCHEDULE_CATCHUP = 6 * 3600  # Missed runs younger than this are caught up, seconds
+SCHEDULER_STATE_FILE = os.path.join(DATA_DIR, "scheduler.json")  # Last successful run per job
+BROADCAST_MAX_AGE = 600  # Broadcast reuses prices fetched within this many seconds
+
+COMPARE_MAX_LITERS = 10  # Max liters values in one /compare
+
+# Rendered /price embeds
+EMBED_CACHE_SIZE = 64  # Max cached (liters, data version) embeds
+HOT_LITERS = (1, 10, 40, 50)  # Pre-rendered after every refresh
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
 intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+if SHARD_COUNT:
+    # Shards in this process; several processes may each run a part of SHARD_COUNT
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT,
+                                  shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
 
-COUNTRIES = [
-    "Россия", "Германия", "Чехия", "Украина"
-]
+# Layout drift found by the scraper becomes an on_pattern_drift(country, fuel, reason, previous, index) event
+drift_listeners.append(lambda *args: bot.dispatch("pattern_drift", *args))
 
-URLS = {
-    "Россия": "https://autotraveler.ru/russia/#fuel",
-    "Германия": "https://autotraveler.ru/germany/#fuel",
-    "Чехия": "https://autotraveler.ru/czech/#fuel",
-    "Украина": "https://autotraveler.ru/ukraine/#fuel"
-}
+# Bot metrics, served with the scraper metrics by start_metrics_server
+PRICE_COMMAND_DURATION = metrics.histogram(
+    "ft_price_command_duration_seconds", "/price latency from invocation to the reply being sent")
+PLAYBACK_START = metrics.histogram(
+    "ft_voice_playback_start_seconds", "Time from play_sound to the first audio packet being read")
 
-# Country flags mapping
-COUNTRY_FLAGS = {
-    "Россия": "🇷🇺", "Германия": "🇩🇪", "Чехия": "🇨🇿", "Украина": "🇺🇦"
-}
 
-# Regex patterns that work with actual website HTML structure
-PATTERNS = {
-    "Россия": {
-        "petrol": [
-            r"АИ-95</span>.*?RUB.*?<span[^>]*>([\d\.,]+)</span>\s*\(€[^\d]*([\d\.,]+)\)",  # HTML with RUB and EUR
-            r"АИ-95</span>.*?€[^\d]*([\d\.,]+)",  # EUR from HTML
-            r"АИ-95.*?€\s*([\d\.,]+)",  # Fallback EUR
-        ],
-        "diesel": [
-            r"ДТ</span>.*?RUB.*?<span[^>]*>([\d\.,]+)</span>\s*\(€[^\d]*([\d\.,]+)\)",  # HTML with RUB and EUR
-            r"ДТ</span>.*?€[^\d]*([\d\.,]+)",  # EUR from HTML
-            r"ДТ[^П].*?€\s*([\d\.,]+)",  # Fallback EUR (avoid ДТП)
-        ],
-    },
-    "Германия": {
-        "petrol": [
-            r"Super\s*\(95\).*?€.*?<span[^>]*>([\d\.,]+)</span>",  # HTML span structure
-            r"E10.*?€.*?<span[^>]*>([\d\.,]+)</span>",  # Alternative E10 pattern
-            r"Super\s*\(95\).*?€.*?([\d\.,]+)",  # Fallback
-        ],
-        "diesel": [
-            r"Diesel.*?€.*?<span[^>]*>([\d\.,]+)</span>",  # HTML span structure
-            r"Diesel.*?€.*?([\d\.,]+)",  # Fallback
-        ],
-    },
-    "Чехия": {
-        "petrol": [
-            r"Natural\s*95</span>.*?CZK.*?<span[^>]*>([\d\.,]+)</span>\s*\(€\s*([\d\.,]+)\)",  # HTML with CZK and EUR
-            r"Natural\s*95</span>.*?€\s*([\d\.,]+)",  # EUR from HTML
-            r"Natural\s*95.*?€\s*([\d\.,]+)",  # Fallback EUR
-        ],
-        "diesel": [
-            r"Nafta</span>.*?CZK.*?<span[^>]*>([\d\.,]+)</span>\s*\(€\s*([\d\.,]+)\)",  # HTML with CZK and EUR
-            r"Nafta</span>.*?€\s*([\d\.,]+)",  # EUR from HTML
-            r"Nafta.*?€\s*([\d\.,]+)",  # Fallback EUR
-        ],
-    },
-    "Украина": {
-        "petrol": [
-            r"АИ-95</span>.*?UAH.*?<span[^>]*>([\d\.,]+)</span>\s*\(€\s*([\d\.,]+)\)",  # HTML with UAH and EUR
-            r"АИ-95.*?UAH.*?([\d\.,]+).*?\(€\s*([\d\.,]+)\)",  # Alternative pattern
-            r"АИ-95.*?€\s*([\d\.,]+)",  # Fallback EUR only
-        ],
-        "diesel": [
-            r"ДТ</span>.*?UAH.*?<span[^>]*>([\d\.,]+)</span>\s*\(€\s*([\d\.,]+)\)",  # HTML with UAH and EUR
-            r"ДТ.*?UAH.*?([\d\.,]+).*?\(€\s*([\d\.,]+)\)",  # Alternative pattern
-            r"ДТ[^П].*?€\s*([\d\.,]+)",  # Fallback EUR only
-        ],
-    }
-}
+# Global variables
+fuel_data = {}
+data_version = 0  # Bumped on every fuel_data update, invalidates rendered embeds
+last_refresh_at = 0.0  # time.time() of the last successful refresh
+last_price_message_id = None
+_embed_cache = OrderedDict()  # (liters, data_version) -> discord.Embed, LRU order
+_refresh_task = None  # In-flight refresh shared by concurrent update_prices calls
+_eur_vector = (None, [], array("d"))  # (data_version, rows, EUR prices) for /compare
 
-# Country-specific currency information
-COUNTRY_CURRENCIES = {
-    "Россия": "RUB", "Германия": "EUR", "Чехия": "CZK", "Украина": "UAH"
-}
 
+# === Guild configuration ===
+class GuildConfig:
+    """Channels the bot uses in one guild"""
+    __slots__ = ("guild_id", "text_channel_id", "voice_channel_id")
 
-# Enhanced patterns for better data extraction
-def get_country_patterns(country):
-    """Get regex patterns for a specific country"""
-    if country in PATTERNS:
-        return PATTERNS[country]
-
-    # Improved patterns that focus on realistic price ranges and avoid date/time matches
-    return {
-        "petrol": [
-            # More specific patterns that avoid large numbers and dates
-            r"(?:Super|Petrol|Benzin|95|E5|SP95).*?€\s*([0-3]\.\d{1,3})",  # EUR prices 0-3.999
-            r"(?:Super|Petrol|Benzin|95|E5|SP95).*?(\d{1,3}\.\d{1,3})\s*€",  # EUR prices reversed
-            r"95.*?€\s*([0-3]\.\d{1,3})",  # 95 octane EUR
-            r"бензин.*?([0-9]{1,3}\.[0-9]{1,3})",  # Local currency (more conservative)
-        ],
-        "diesel": [
-            r"(?:Diesel|Dizel|Дизель).*?€\s*([0-3]\.\d{1,3})",  # EUR prices 0-3.999
-            r"(?:Diesel|Dizel|Дизель).*?(\d{1,3}\.\d{1,3})\s*€",  # EUR prices reversed
-            r"дизель.*?([0-9]{1,3}\.[0-9]{1,3})",  # Local currency
-        ],
-    }
-
-
-def format_price(country, fuel_type, match, pattern):
-    """Format price based on country and available data"""
-    try:
-        if not match:
-            return "Нет данных"
-
-        groups = match.groups()
-
-        if country == "Россия":
-            if len(groups) >= 2 and groups[1]:  # RUB with EUR
-                rub_price = groups[0].replace(",", ".")
-                eur_price = groups[1].replace(",", ".")
-                return f"{rub_price} RUB (€{eur_price})"
-            elif len(groups) >= 1 and groups[0]:  # Single currency
-                price = groups[0].replace(",", ".")
-                if "RUB" in pattern:
-                    return f"{price} RUB"
-                else:
-                    return f"€{price}"
-
-        elif country == "Германия":
-            if len(groups) >= 1 and groups[0]:
-                price = groups[0].replace(",", ".")
-                return f"€{price}"
-
-        elif country == "Чехия":
-            if len(groups) >= 2 and groups[1]:  # CZK with EUR
-                czk_price = groups[0].replace(",", ".")
-                eur_price = groups[1].replace(",", ".")
-                return f"{czk_price} CZK (€{eur_price})"
-            elif len(groups) >= 1 and groups[0]:  # Single currency
-                price = groups[0].replace(",", ".")
-                if "CZK" in pattern:
-                    return f"{price} CZK"
-                else:
-                    return f"€{price}"
-
-        elif country == "Украина":
-            if len(groups) >= 2 and groups[1]:  # UAH with EUR
-                uah_price = groups[0].replace(",", ".")
-                eur_price = groups[1].replace(",", ".")
-                return f"{uah_price} UAH (€{eur_price})"
-            elif len(groups) >= 1 and groups[0]:  # Single currency
-                price = groups[0].replace(",", ".")
-                if "UAH" in pattern:
-                    return f"{price} UAH"
-                else:
-                    return f"€{price}"
-
-        # Enhanced formatting for all other countries with local currency
-        else:
-            if len(groups) >= 1 and groups[0]:
-                price = groups[0].replace(",", ".")
-                currency = COUNTRY_CURRENCIES.get(country, "EUR")
+    def __init__(self, guild_id, text_channel_id, voice_channel_id=None):
+        self.guild_id = guild_id
+        self.text_channel_id = text_channel_id
+        self.voice_channel_id = voice_channel_id
 
-                # For EUR countries and EUR prices detected
-                if currency == "EUR" or "€" in pattern:
-                    try:
-                        price_float = float(price)
-                        # Validate EUR price ranges
-                        if 0.5 <= price_float <= 3.0:
-                            return f"€{price}"
-                        else:
-                            return "Нет данных"  # Invalid EUR price range
-                    except:
-                        return f"€{price}"
-                else:
-                    # For non-EUR countries with local currency data
-                    try:
-                        price_float = float(price)
-                        # Simple conversion estimates for our countries
-                        eur_estimates = {
-                            "RUB": price_float * 0.011,
-                            "CZK": price_float * 0.041,
-                            "UAH": price_float * 0.024
-                        }
-
-                        if currency in eur_estimates and price_float < 10000:  # Reasonable local currency check
-                            eur_price = round(eur_estimates[currency], 3)
-                            if 0.3 <= eur_price <= 5.0:  # Reasonable EUR equivalent range
-                                return f"{price} {currency} (€{eur_price})"
-                            else:
-                                return "Нет данных"  # Invalid converted price
-                        else:
-                            return f"{price} {currency}"
-                    except:
-                        return f"{price} {currency}"
-
-        return "Нет данных"
-    except Exception as e:
-        logger.error(f"Error formatting price for {country} {fuel_type}: {e}")
-        return "Ошибка форматирования"
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
 
 
-async def fetch_country_price(session, country):
-    """Fetch fuel prices for a specific country"""
-    url = URLS[country]
-    patterns = get_country_patterns(country)
-    result = {"petrol": "Нет данных", "diesel": "Нет данных"}
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` shared by all bot processes on this host"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file is closed
+        yield
 
-    try:
-        async with session.get(url, headers={
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}) as resp:
-            if resp.status != 200:
-                logger.error(f"Failed to fetch {country}: HTTP {resp.status}")
-                return result
-
-            text = await resp.text()
-            logger.info(f"Successfully fetched data for {country}")
-
-            # Parse petrol prices
-            for i, pattern in enumerate(patterns["petrol"]):
-                match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-                if match:
-                    result["petrol"] = format_price(country, "petrol", match, pattern)
-                    logger.info(
-                        f"{country} petrol found with pattern {i + 1}: {result['petrol']} (groups: {match.groups()})")
-                    break
-                else:
-                    logger.debug(f"{country} petrol pattern {i + 1} failed")
-
-            # Parse diesel prices
-            for i, pattern in enumerate(patterns["diesel"]):
-                match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-                if match:
-                    result["diesel"] = format_price(country, "diesel", match, pattern)
-                    logger.info(
-                        f"{country} diesel found with pattern {i + 1}: {result['diesel']} (groups: {match.groups()})")
-                    break
-                else:
-                    logger.debug(f"{country} diesel pattern {i + 1} failed")
-
-            if result["petrol"] == "Нет данных":
-                logger.warning(f"No petrol price found for {country}")
-            if result["diesel"] == "Нет данных":
-                logger.warning(f"No diesel price found for {country}")
-
-    except asyncio.TimeoutError:
-        logger.error(f"Timeout while fetching data for {country}")
-    except Exception as e:
-        logger.error(f"Error fetching data for {country}: {e}")
 
-    return result
+class GuildConfigStore:
+    """Per-guild configuration kept in a JSON file
 
+    Several processes share the file: every change re-reads it under
+    file_lock and writes back the merged result.
+    """
 
-async def fetch_fuel_prices():
-    """Fetch fuel prices for all countries"""
-    timeout = aiohttp.ClientTimeout(total=30)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        results = {}
-        for country in COUNTRIES:
-            logger.info(f"Fetching prices for {country}")
-            results[country] = await fetch_country_price(session, country)
-        return results
+    def __init__(self, path, default=None):
+        self.path = path
+        self.default = default
+        self.configs = {}
 
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+            self.configs = {entry["guild_id"]: GuildConfig(**entry) for entry in entries}
+        except FileNotFoundError:
+            self.configs = {self.default.guild_id: self.default} if self.default else {}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Failed to load guild config {self.path}: {e}")
+            self.configs = {self.default.guild_id: self.default} if self.default else {}
+        logger.info(f"Loaded configuration for {len(self.configs)} guild(s)")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump([config.to_dict() for config in self.configs.values()], f, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def get(self, guild_id):
+        return self.configs.get(guild_id)
+
+    def set(self, config):
+        with file_lock(self.path):
+            self.load()
+            self.configs[config.guild_id] = config
+            self.save()
+
+    def all(self):
+        return list(self.configs.values())
+
+
+guild_configs = GuildConfigStore(GUILDS_CONFIG, GuildConfig(GUILD_ID, TEXT_CHANNEL_ID, VOICE_CHANNEL_ID))
+guild_configs.load()
 
-# Global variables
-fuel_data = {}
-last_price_message_id = None
 
+class RateLimiter:
+    """Token bucket: on average `rate` acquisitions per second, bursts of up to `burst`"""
 
-async def connect_voice():
-    """Connect to voice channel (simplified to reduce reconnection loops)"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+broadcast_limiter = RateLimiter(BROADCAST_RATE)
+
+
+async def connect_voice(config):
+    """Connect to a guild's voice channel (simplified to reduce reconnection loops)"""
     try:
         await bot.wait_until_ready()
-        guild = bot.get_guild(GUILD_ID)
+        guild = bot.get_guild(config.guild_id)
         if not guild:
-            logger.error("Guild not found")
+            logger.error(f"Guild {config.guild_id} not found")
             return
 
-        channel = guild.get_channel(VOICE_CHANNEL_ID)
+        channel = guild.get_channel(config.voice_channel_id) if config.voice_channel_id else None
         if channel and not guild.voice_client:
             await channel.connect()
-            logger.info("Connected to voice channel")
+            logger.info(f"Connected to voice channel in {guild.name}")
+    except Exception as e:
+        logger.error(f"Failed to connect to voice channel in guild {config.guild_id}: {e}")
+
+
+async def connect_all_voice():
+    """Connect to the voice channels of all configured guilds on this process concurrently"""
+    await asyncio.gather(*(connect_voice(config) for config in local_guild_configs()))
+
+
+class BufferedOpusAudio(discord.AudioSource):
+    """Plays pre-encoded Opus packets from memory, no ffmpeg process per play"""
+
+    def __init__(self, packets, requested_at=None):
+        self.packets = packets
+        self.position = 0
+        self.requested_at = requested_at  # perf_counter() of the play request, for PLAYBACK_START
+
+    def read(self):
+        if self.position == 0 and self.requested_at is not None:
+            PLAYBACK_START.observe(time.perf_counter() - self.requested_at)
+        if self.position >= len(self.packets):
+            return b""
+        packet = self.packets[self.position]
+        self.position += 1
+        return packet
+
+    def is_opus(self):
+        return True
+
+
+# Opus packets of SOUND_FILE, filled by load_sound()
+_sound_packets = None
+
+
+async def encode_opus_packets(path):
+    """Transcode an audio file to 20 ms Opus packets with a single ffmpeg run"""
+    proc = await asyncio.create_subprocess_exec(
+        FFMPEG_EXECUTABLE, "-loglevel", "warning", "-i", path, "-map_metadata", "-1",
+        "-f", "opus", "-c:a", "libopus", "-ar", "48000", "-ac", "2", "-b:a", "128k", "pipe:1",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    data, errors = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with {proc.returncode}: {errors.decode(errors='replace').strip()}")
+
+    # Skip the Ogg Opus header packets, only audio frames are sent to Discord
+    return [
+        packet for packet in OggStream(io.BytesIO(data)).iter_packets()
+        if not packet.startswith((b"OpusHead", b"OpusTags"))
+    ]
+
+
+async def load_sound():
+    """Transcode the notification sound once and keep it in memory"""
+    global _sound_packets
+    if not os.path.exists(SOUND_FILE):
+        logger.warning(f"Sound file {SOUND_FILE} not found")
+        return
+    try:
+        _sound_packets = await encode_opus_packets(SOUND_FILE)
+        logger.info(f"Loaded notification sound: {len(_sound_packets)} Opus frames")
     except Exception as e:
-        logger.error(f"Failed to connect to voice channel: {e}")
+        logger.error(f"Failed to pre-encode sound, falling back to per-play ffmpeg: {e}")
 
 
-async def play_sound():
-    """Play notification sound"""
-    guild = bot.get_guild(GUILD_ID)
+async def play_sound(guild_id):
+    """Play notification sound in a guild's voice channel"""
+    requested_at = time.perf_counter()
+    guild = bot.get_guild(guild_id)
     if not guild:
         return
 
     vc = guild.voice_client
     if vc and vc.is_connected() and not vc.is_playing():
         try:
-            if os.path.exists(SOUND_FILE):
+            if _sound_packets:
+                vc.play(BufferedOpusAudio(_sound_packets, requested_at))
+                logger.info("Playing notification sound")
+            elif os.path.exists(SOUND_FILE):
                 vc.stop()
                 vc.play(discord.FFmpegPCMAudio(SOUND_FILE))
+                PLAYBACK_START.observe(time.perf_counter() - requested_at)  # Spawn only, first read is not visible
                 logger.info("Playing notification sound")
             else:
                 logger.warning(f"Sound file {SOUND_FILE} not found")
@@ -319,23 +306,392 @@ async def play_sound():
             logger.error(f"Error playing sound: {e}")
 
 
-async def update_prices():
-    """Update fuel prices from web sources"""
-    global fuel_data
+async def play_sound_everywhere():
+    """Play the notification sound in every connected voice channel at once"""
+    await asyncio.gather(*(play_sound(vc.guild.id) for vc in bot.voice_clients))
+
+
+# === Shared price snapshot ===
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SnapshotStore:
+    """Price snapshot and scraper leadership shared by all bot processes through SQLite (WAL)
+
+    One process holds a lease and is the only one that scrapes; it
+    publishes every new snapshot with an increasing version. The others
+    read it, and only when PRAGMA data_version says another connection
+    has committed since their last look.
+    """
+
+    def __init__(self, path, owner):
+        self.path = path
+        self.owner = owner
+        self.conn = None
+        self.is_leader = False
+        self.available = False  # Last election reached the database
+        self.version = 0  # Version of the snapshot this process holds
+        self.data_version = None
+
+    def connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS snapshot ("
+                              "id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL, "
+                              "updated_at REAL NOT NULL, payload TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS leader ("
+                              "id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+        return self.conn
+
+    @property
+    def scrapes(self):
+        """Whether this process fetches prices itself: as the leader, or alone while the store is unusable"""
+        return self.is_leader or not self.available
+
+    def elect(self, lease):
+        """Acquire or renew the scraper lease, returns whether this process is the leader"""
+        try:
+            conn = self.connect()
+            conn.execute("BEGIN IMMEDIATE")
+        except (sqlite3.Error, OSError):
+            self.available = self.is_leader = False
+            raise
+        now = time.time()
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM leader WHERE id = 1").fetchone()
+            if row is None or row[0] == self.owner or row[1] < now:
+                conn.execute("INSERT INTO leader (id, owner, expires_at) VALUES (1, ?, ?) "
+                             "ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                             (self.owner, now + lease))
+                leader = True
+            else:
+                leader = False
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            self.available = self.is_leader = False
+            raise
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.available = True
+        if leader != self.is_leader:
+            logger.info(f"{self.owner} is now {'the scraper leader' if leader else 'a snapshot follower'}")
+        self.is_leader = leader
+        return leader
+
+    def publish(self, data, updated_at):
+        """Store a new snapshot, returns its version"""
+        conn = self.connect()
+        payload = json.dumps({country: prices_to_dict(prices) for country, prices in data.items()},
+                             ensure_ascii=False)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version FROM snapshot WHERE id = 1").fetchone()
+            version = (row[0] if row else 0) + 1
+            conn.execute("INSERT INTO snapshot (id, version, updated_at, payload) VALUES (1, ?, ?, ?) "
+                         "ON CONFLICT(id) DO UPDATE SET version = excluded.version, "
+                         "updated_at = excluded.updated_at, payload = excluded.payload",
+                         (version, updated_at, payload))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.version = version
+        return version
+
+    def changed(self):
+        """Cheap check whether another connection has committed since the last call"""
+        data_version = self.connect().execute("PRAGMA data_version").fetchone()[0]
+        changed, self.data_version = data_version != self.data_version, data_version
+        return changed
+
+    def load(self):
+        """Return (version, updated_at, data) of a snapshot newer than ours, or None"""
+        row = self.connect().execute(
+            "SELECT version, updated_at, payload FROM snapshot WHERE id = 1 AND version > ?", (self.version,)
+        ).fetchone()
+        if row is None:
+            return None
+        version, updated_at, payload = row
+        data = {country: prices_from_dict(prices) for country, prices in json.loads(payload).items()}
+        self.version = version
+        return version, updated_at, data
+
+
+snapshots = SnapshotStore(STATE_DB, INSTANCE_ID)
+_snapshot_task = None
+
+
+def reload_snapshot(force=False):
+    """Swap in the shared snapshot if its version changed, returns True if fuel_data was replaced"""
+    global fuel_data, last_refresh_at
+    if not force and not snapshots.changed():
+        return False
+    loaded = snapshots.load()
+    if loaded is None:
+        return False
+    previous = fuel_data
+    version, last_refresh_at, fuel_data = loaded
+    invalidate_embeds()
+    logger.info(f"Loaded price snapshot v{version}")
+    schedule_price_alerts(previous, fuel_data)
+    return True
+
+
+async def follow_snapshot(max_age=None):
+    """Follower side of a refresh: take the leader's latest snapshot
+
+    With max_age, wait up to SNAPSHOT_WAIT for the leader to publish one
+    that is younger than max_age (e.g. the midnight scrape).
+    """
+    reload_snapshot(force=True)
+    deadline = time.monotonic() + SNAPSHOT_WAIT
+    while max_age is not None and time.time() - last_refresh_at >= max_age and time.monotonic() < deadline:
+        await asyncio.sleep(1)
+        reload_snapshot()
+
+
+async def snapshot_sync_loop():
+    """Renew scraper leadership and pick up new snapshots from other processes"""
+    while True:
+        try:
+            snapshots.elect(LEADER_LEASE)
+            if not snapshots.is_leader and reload_snapshot():
+                # The leader refreshes exchange rates along with the prices
+                fx_rates.load()
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"Snapshot store error: {e}")
+        await asyncio.sleep(SNAPSHOT_POLL)
+
+
+def start_snapshot_sync():
+    """Join the election and load the current snapshot (once per process)"""
+    global _snapshot_task
+    if _snapshot_task is not None:
+        return
+    try:
+        snapshots.elect(LEADER_LEASE)
+        reload_snapshot(force=True)
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Snapshot store error: {e}")
+    if fuel_data:
+        # The stored snapshot was broadcast before the restart
+        mark_broadcast(fuel_data)
+    _snapshot_task = asyncio.create_task(snapshot_sync_loop())
+
+
+# === Price history ===
+HISTORY_PERIODS = ("day", "week", "month")
+# /history periods in days, answered from the coarsest aggregate that still gives enough points
+HISTORY_RANGES = {"7d": 7, "30d": 30, "90d": 90, "1y": 365, "5y": 5 * 365}
+
+
+def history_bucket(ts, period, tz):
+    """Start (epoch seconds) of the local day, ISO week or month containing ts"""
+    day = datetime.fromtimestamp(ts, tz).date()
+    if period == "week":
+        day -= timedelta(days=day.weekday())
+    elif period == "month":
+        day = day.replace(day=1)
+    return int(tz.localize(datetime(day.year, day.month, day.day)).timestamp())
+
+
+class HistoryStore:
+    """Append-only price history in SQLite with day / week / month aggregates
+
+    Raw rows are clustered by (country, fuel, ts). Aggregates are updated as
+    rows are appended, so range queries read at most a few dozen buckets.
+    Aggregates are in EUR, the one amount every country has.
+    """
+
+    def __init__(self, path, tz):
+        self.path = path
+        self.tz = tz
+        self.conn = None
+
+    def connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS price_history ("
+                              "country TEXT NOT NULL, fuel TEXT NOT NULL, ts INTEGER NOT NULL, "
+                              "local_amount REAL, currency TEXT, eur_amount REAL, "
+                              "PRIMARY KEY (country, fuel, ts)) WITHOUT ROWID")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS price_aggregate ("
+                              "period TEXT NOT NULL, country TEXT NOT NULL, fuel TEXT NOT NULL, bucket INTEGER NOT NULL, "
+                              "samples INTEGER NOT NULL, total REAL NOT NULL, low REAL NOT NULL, high REAL NOT NULL, "
+                              "first_ts INTEGER NOT NULL, first REAL NOT NULL, last_ts INTEGER NOT NULL, last REAL NOT NULL, "
+                              "PRIMARY KEY (period, country, fuel, bucket)) WITHOUT ROWID")
+        return self.conn
+
+    def append(self, data, ts):
+        """Store one refresh ({country: {fuel: PriceRecord or None}}), returns the number of new rows"""
+        conn = self.connect()
+        ts = int(ts)
+        buckets = {period: history_bucket(ts, period, self.tz) for period in HISTORY_PERIODS}
+        added = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for country, prices in data.items():
+                for fuel, record in prices.items():
+                    if record is None:
+                        continue
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO price_history VALUES (?, ?, ?, ?, ?, ?)",
+                        (country, fuel, ts, record.local_amount, record.currency, record.eur_amount))
+                    if cursor.rowcount != 1:
+                        continue  # Already recorded, do not count it twice
+                    added += 1
+                    if record.eur_amount is None:
+                        continue
+                    eur = record.eur_amount
+                    conn.executemany(
+                        "INSERT INTO price_aggregate VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(period, country, fuel, bucket) DO UPDATE SET "
+                        "samples = samples + 1, total = total + excluded.total, "
+                        "low = min(low, excluded.low), high = max(high, excluded.high), "
+                        "first_ts = CASE WHEN excluded.first_ts < first_ts THEN excluded.first_ts ELSE first_ts END, "
+                        "first = CASE WHEN excluded.first_ts < first_ts THEN excluded.first ELSE first END, "
+                        "last_ts = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_ts ELSE last_ts END, "
+                        "last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END",
+                        [(period, country, fuel, bucket, eur, eur, eur, ts, eur, ts, eur)
+                         for period, bucket in buckets.items()])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def summary(self, country, fuel, since, period):
+        """Min, max, average and trend of EUR prices since `since` from `period` aggregates, or None"""
+        rows = self.connect().execute(
+            "SELECT samples, total, low, high, first_ts, first, last_ts, last FROM price_aggregate "
+            "WHERE period = ? AND country = ? AND fuel = ? AND bucket >= ? ORDER BY bucket",
+            (period, country, fuel, history_bucket(since, period, self.tz))
+        ).fetchall()
+        if not rows:
+            return None
+        samples = sum(row[0] for row in rows)
+        return {
+            "samples": samples,
+            "min": min(row[2] for row in rows),
+            "max": max(row[3] for row in rows),
+            "avg": sum(row[1] for row in rows) / samples,
+            "first_ts": rows[0][4],
+            "first": rows[0][5],
+            "last_ts": rows[-1][6],
+            "last": rows[-1][7],
+        }
+
+
+def history_period_for(days):
+    """Aggregate level for a range: daily up to a month, weekly up to a year, monthly beyond"""
+    if days <= 31:
+        return "day"
+    if days <= 366:
+        return "week"
+    return "month"
+
+
+history = HistoryStore(HISTORY_DB, pytz.timezone(SCHEDULE_TIMEZONE))
+
+
+def record_history(data, ts):
+    """Append freshly scraped prices to the history store"""
+    try:
+        added = history.append(data, ts)
+        logger.info(f"Recorded {added} price(s) in history")
+    except sqlite3.Error as e:
+        logger.error(f"Failed to record price history: {e}")
+
+
+async def refresh_prices(max_age=None):
+    """Fetch a new snapshot and swap it in atomically
+
+    Only the leader process scrapes and publishes; followers take the
+    leader's snapshot instead. Without a usable shared store every process
+    scrapes for itself.
+    """
+    global fuel_data, last_refresh_at
+    if not snapshots.scrapes:
+        await follow_snapshot(max_age)
+        return
+
+    logger.info("Updating fuel prices...")
+    await fx_rates.refresh()
+    data, parsed = await fetch_fuel_prices()
+    await asyncio.to_thread(pattern_stats.save)
+    # Cached and 304 responses repeat prices that are already in the history
+    fresh = {country: prices for country, prices in data.items()
+             if country in parsed and any(record is not None for record in prices.values())}
+
+    # Keep the last good values for countries that returned nothing this time
+    for country, prices in data.items():
+        if all(record is None for record in prices.values()) and country in fuel_data:
+            logger.warning(f"No prices for {country}, keeping previous values")
+            data[country] = fuel_data[country]
+
+    if not any(record is not None for prices in data.values() for record in prices.values()):
+        logger.error("No prices fetched, keeping the previous snapshot")
+        return
+
+    # Readers hold either the old or the new dict, never a half-filled one
+    previous, fuel_data = fuel_data, data
+    last_refresh_at = time.time()
+    invalidate_embeds()
+    logger.info("Fuel prices updated successfully")
+    schedule_price_alerts(previous, data)
+
     try:
-        logger.info("Updating fuel prices...")
-        data = await fetch_fuel_prices()
-        fuel_data.clear()
-        fuel_data.update(data)
-        logger.info("Fuel prices updated successfully")
+        version = snapshots.publish(data, last_refresh_at)
+        logger.info(f"Published price snapshot v{version}")
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Failed to publish price snapshot: {e}")
+
+    # Only what was parsed now: carried-over and cached values would repeat old prices
+    record_history(fresh, last_refresh_at)
+
+
+async def update_prices(max_age=None):
+    """Update fuel prices from web sources
+
+    Concurrent callers share one in-flight refresh. Readers keep using the
+    previous snapshot until the new one is ready. With max_age, a snapshot
+    younger than max_age seconds is kept as is.
+    """
+    global _refresh_task
+    refreshing = _refresh_task is not None and not _refresh_task.done()
+    if max_age is not None and not refreshing and fuel_data and time.time() - last_refresh_at < max_age:
+        return
+
+    if not refreshing:
+        _refresh_task = asyncio.create_task(refresh_prices(max_age))
+    else:
+        logger.info("Price refresh already in progress, waiting for it")
+
+    try:
+        # Shielded so a cancelled caller does not cancel the refresh for everyone else
+        await asyncio.shield(_refresh_task)
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         logger.error(f"Error updating prices: {e}")
+        return
 
+    if max_age is not None and not snapshots.scrapes and time.time() - last_refresh_at >= max_age:
+        # The shared refresh did not wait for new data (e.g. the refresh job on a follower
+        # started just before the broadcast): wait for the leader's snapshot now
+        await follow_snapshot(max_age)
 
-async def send_prices(channel, liters=1, new_message=False, edit_message=False):
-    """Send fuel prices embed to channel"""
-    global last_price_message_id
 
+def build_prices_embed(liters=1):
+    """Render the fuel prices embed for an amount of liters"""
     if not fuel_data:
         embed = discord.Embed(
             title="⛽ Цены на топливо",
@@ -347,9 +703,7 @@ async def send_prices(channel, liters=1, new_message=False, edit_message=False):
             value="Данные о ценах временно недоступны",
             inline=False
         )
-        if new_message:
-            await channel.send(embed=embed)
-        return
+        return embed
 
     # Simple single embed for 4 countries
     embed = discord.Embed(
@@ -359,29 +713,17 @@ async def send_prices(channel, liters=1, new_message=False, edit_message=False):
     )
 
     for country, values in fuel_data.items():
-        petrol_price = values["petrol"]
-        diesel_price = values["diesel"]
+        petrol = values["petrol"]
+        diesel = values["diesel"]
+        petrol_price = render_price(petrol)
+        diesel_price = render_price(diesel)
 
         # Calculate prices for multiple liters if needed
-        if liters != 1 and petrol_price != "Нет данных" and "€" in petrol_price:
-            eur_match = re.search(r"€([\d\.,]+)", petrol_price)
-            if eur_match:
-                try:
-                    base_price = float(eur_match.group(1).replace(",", "."))
-                    calculated_price = round(base_price * liters, 2)
-                    petrol_price += f" → €{calculated_price} за {liters}л"
-                except:
-                    pass
-
-        if liters != 1 and diesel_price != "Нет данных" and "€" in diesel_price:
-            eur_match = re.search(r"€([\d\.,]+)", diesel_price)
-            if eur_match:
-                try:
-                    base_price = float(eur_match.group(1).replace(",", "."))
-                    calculated_price = round(base_price * liters, 2)
-                    diesel_price += f" → €{calculated_price} за {liters}л"
-                except:
-                    pass
+        if liters != 1 and petrol is not None and petrol.eur_amount is not None:
+            petrol_price += f" → €{round(petrol.eur_amount * liters, 2)} за {liters}л"
+
+        if liters != 1 and diesel is not None and diesel.eur_amount is not None:
+            diesel_price += f" → €{round(diesel.eur_amount * liters, 2)} за {liters}л"
 
         flag = COUNTRY_FLAGS.get(country, "🏳️")
         embed.add_field(
@@ -390,41 +732,600 @@ async def send_prices(channel, liters=1, new_message=False, edit_message=False):
             inline=False
         )
 
+    return embed
+
+
+def get_prices_embed(liters=1):
+    """Cached build_prices_embed, keyed by liters and the current data version"""
+    if float(liters).is_integer():
+        liters = int(liters)  # 50.0 and 50 share one entry and render as "50 л"
+
+    key = (liters, data_version)
+    embed = _embed_cache.get(key)
+    if embed is not None:
+        _embed_cache.move_to_end(key)
+        return embed
+
+    embed = build_prices_embed(liters)
+    _embed_cache[key] = embed
+    if len(_embed_cache) > EMBED_CACHE_SIZE:
+        _embed_cache.popitem(last=False)
+    return embed
+
+
+def invalidate_embeds():
+    """Start a new data version and pre-render the hot liters values for it"""
+    global data_version
+    data_version += 1
+    _embed_cache.clear()
+    for liters in HOT_LITERS:
+        get_prices_embed(liters)
+
+
+def eur_price_vector():
+    """Row labels [(country, fuel)] and an array of their EUR prices per liter (NaN if unknown)
+
+    Built once per data version, /compare only scales it.
+    """
+    global _eur_vector
+    if _eur_vector[0] != data_version:
+        rows = [(country, fuel) for country in fuel_data for fuel in FUEL_TYPES]
+        prices = array("d", (
+            record.eur_amount if (record := fuel_data[country][fuel]) is not None and record.eur_amount is not None
+            else math.nan
+            for country, fuel in rows
+        ))
+        _eur_vector = (data_version, rows, prices)
+    return _eur_vector[1], _eur_vector[2]
+
+
+def cost_matrix(liters_values, currency="EUR"):
+    """Cost of each liters value for every country and fuel in `currency`
+
+    Returns (rows, costs): costs is a flat row-major array, costs[r * len(liters_values) + j]
+    is rows[r] for liters_values[j] (NaN if the price is unknown).
+    """
+    rate = fx_rates.eur_rate(currency)
+    if rate is None:
+        raise KeyError(currency)
+    rows, prices = eur_price_vector()
+    factors = [liters / rate for liters in liters_values]
+    # One pass over the whole matrix, no per-cell lookups or branching
+    costs = array("d", (price * factor for price in prices for factor in factors))
+    return rows, costs
+
+
+def parse_liters_list(text):
+    """'1, 10 40' -> [1, 10, 40]; raises ValueError on bad or out-of-range values"""
+    values = [float(part) for part in re.split(r"[\s,;]+", text.strip()) if part]
+    if not values or len(values) > COMPARE_MAX_LITERS or any(not 0 < value <= 1000 for value in values):
+        raise ValueError(text)
+    return [int(value) if value.is_integer() else value for value in values]
+
+
+def build_compare_embed(liters_values, currency="EUR"):
+    """Render the country x fuel x liters cost table"""
+    rows, costs = cost_matrix(liters_values, currency)
+    width = len(liters_values)
+    fuel_names = {"petrol": "Бензин", "diesel": "Дизель"}
+    label_width = max((len(f"{country} {fuel_names[fuel]}") for country, fuel in rows), default=0)
+
+    lines = [" " * label_width + "".join(f"{f'{liters} л':>11}" for liters in liters_values)]
+    for r, (country, fuel) in enumerate(rows):
+        cells = costs[r * width:(r + 1) * width]
+        lines.append(f"{country} {fuel_names[fuel]}".ljust(label_width)
+                     + "".join(f"{'—' if math.isnan(cost) else f'{cost:,.2f}':>11}" for cost in cells))
+
+    embed = discord.Embed(title=f"⛽ Сравнение стоимости топлива ({currency})", color=0x00ffcc)
+    if not rows:
+        embed.description = "Данные о ценах временно недоступны"
+        return embed
+    table = "\n".join(lines)
+    if len(table) > 4000:  # Embed description limit is 4096
+        table = table[:table.rfind("\n", 0, 4000)] + "\n…"
+    embed.description = f"```\n{table}\n```"
+    if fx_rates.updated_at:
+        embed.set_footer(text=f"Курсы валют от {time.strftime('%Y-%m-%d %H:%M', time.localtime(fx_rates.updated_at))}")
+    return embed
+
+
+async def send_prices(channel, liters=1, new_message=False, edit_message=False):
+    """Send fuel prices embed to channel"""
+    global last_price_message_id
+
+    embed = get_prices_embed(liters)
     try:
         if new_message:
             msg = await channel.send(embed=embed)
-            last_price_message_id = msg.id
+            if fuel_data:
+                last_price_message_id = msg.id
     except Exception as e:
         logger.error(f"Error sending prices message: {e}")
 
+
+def local_guild_configs():
+    """Configs of the guilds served by this process's shards"""
+    return [config for config in guild_configs.all() if bot.get_guild(config.guild_id) is not None]
+
+
+async def send_to_channel(channel_id, embed, semaphore, content=None):
+    """Post an embed (or text) to one text channel within the broadcast limits, returns True on success"""
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        return False
+    async with semaphore:
+        await broadcast_limiter.acquire()
+        try:
+            await channel.send(content=content, embed=embed)
+            return True
+        except discord.HTTPException as e:  # 429s are retried by discord.py per bucket
+            logger.error(f"Failed to post prices to channel {channel_id}: {e}")
+            return False
+
+
+def price_changes(old, new):
+    """[(country, fuel, old record, new record)] for prices that differ between two snapshots"""
+    changes = []
+    for country, prices in new.items():
+        previous = old.get(country, {})
+        for fuel, record in prices.items():
+            before = previous.get(fuel)
+            if price_key(before) != price_key(record):
+                changes.append((country, fuel, before, record))
+    return changes
+
+
+def price_key(record):
+    """The amounts of a record, ignoring which pattern found them"""
+    return None if record is None else (record.local_amount, record.currency, record.eur_amount)
+
+
+_broadcast_baseline = None  # fuel_data as of the last broadcast, None if there was none yet
+
+
+def mark_broadcast(data):
+    global _broadcast_baseline
+    _broadcast_baseline = data
+
+
+async def broadcast_prices(liters=1, sound=True, changes=None):
+    """Post the same prebuilt embed to every configured text channel on this process's shards and play the sound
+
+    `changes` (from price_changes) are listed in the embed description.
+    Returns the number of channels the embed reached.
+    """
+    embed = get_prices_embed(liters)
+    if changes:
+        fuel_names = {"petrol": "Бензин", "diesel": "Дизель"}
+        embed = embed.copy()
+        embed.description = "\n".join(
+            f"{COUNTRY_FLAGS.get(country, '🏳️')} {country} · {fuel_names[fuel]}: "
+            f"{render_price(before)} → **{render_price(after)}**"
+            for country, fuel, before, after in changes
+        )[:4000]
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    configs = local_guild_configs()
+    sent = await asyncio.gather(*(send_to_channel(config.text_channel_id, embed, semaphore) for config in configs))
+    logger.info(f"Prices posted to {sum(sent)} of {len(configs)} channel(s)")
+    if sound:
+        await play_sound_everywhere()
+    return sum(sent)
+
+
+_broadcast_lock = None  # Created in the running loop by broadcast_changes
+
+
+async def broadcast_changes(liters=1, sound=True):
+    """Broadcast the prices only if they changed since the last broadcast
+
+    Callers are serialized (the catch-up job and the startup refresh can
+    finish together) and the baseline moves before the sends, so one
+    change is posted once. Returns the number of channels reached, or
+    None when nothing changed.
+    """
+    global _broadcast_lock
+    if _broadcast_lock is None:
+        _broadcast_lock = asyncio.Lock()
+    async with _broadcast_lock:
+        previous, data = _broadcast_baseline, fuel_data
+        changes = None
+        if previous is not None:
+            changes = price_changes(previous, data)
+            if not changes:
+                logger.info("Prices unchanged since the last broadcast, not posting")
+                return None
+        mark_broadcast(data)
+        sent = await broadcast_prices(liters, sound, changes)
+        if not sent and _broadcast_baseline is data:
+            # Nothing was posted: the next broadcast reports these changes again
+            mark_broadcast(previous)
+        return sent
+
+
+# === Price alerts ===
+ALERT_DIRECTIONS = ("below", "above")
+
+
+class Subscription:
+    """Notify a user in a channel when a fuel's EUR price crosses a threshold"""
+    __slots__ = ("user_id", "channel_id", "country", "fuel", "direction", "threshold")
+
+    def __init__(self, user_id, channel_id, country, fuel, direction, threshold):
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.country = country
+        self.fuel = fuel
+        self.direction = direction
+        self.threshold = threshold
+
+    def key(self):
+        return self.country, self.fuel, self.direction
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SubscriptionStore:
+    """Price alert subscriptions kept in a JSON file
+
+    Each (country, fuel, direction) has a list sorted by threshold, so a
+    price move from `old` to `new` finds the crossed thresholds with two
+    bisections instead of a scan over every subscription. Changes re-read
+    the file under file_lock, so processes do not overwrite each other.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = {}  # (country, fuel, direction) -> [(threshold, user_id, Subscription)] sorted
+
+    def load(self):
+        self.index = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+            for entry in entries:
+                self._insert(Subscription(**entry))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Failed to load subscriptions {self.path}: {e}")
+        logger.info(f"Loaded {len(self.all())} price alert(s)")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump([subscription.to_dict() for subscription in self.all()], f, ensure_ascii=False, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def _insert(self, subscription):
+        entries = self.index.setdefault(subscription.key(), [])
+        # A user has one alert per key, so (threshold, user_id) never ties and Subscription is never compared
+        bisect.insort(entries, (subscription.threshold, subscription.user_id, subscription))
+
+    def all(self):
+        return [entry[2] for entries in self.index.values() for entry in entries]
+
+    def for_user(self, user_id):
+        return [subscription for subscription in self.all() if subscription.user_id == user_id]
+
+    def add(self, subscription, limit=None):
+        """Add or replace the user's alert for the same country, fuel and direction
+
+        Returns False without saving if the user already has `limit` other alerts.
+        """
+        with file_lock(self.path):
+            self.load()
+            others = [s for s in self.for_user(subscription.user_id) if s.key() != subscription.key()]
+            if limit is not None and len(others) >= limit:
+                return False
+            self._remove(subscription.user_id, subscription.country, subscription.fuel, subscription.direction)
+            self._insert(subscription)
+            self.save()
+        return True
+
+    def remove(self, user_id, country=None, fuel=None, direction=None):
+        """Remove the user's alerts matching the given filters, returns how many were removed"""
+        with file_lock(self.path):
+            self.load()
+            removed = self._remove(user_id, country, fuel, direction)
+            if removed:
+                self.save()
+        return removed
+
+    def _remove(self, user_id, country=None, fuel=None, direction=None):
+        removed = 0
+        for key, entries in list(self.index.items()):
+            if any(value is not None and value != part for value, part in zip((country, fuel, direction), key)):
+                continue
+            kept = [entry for entry in entries if entry[1] != user_id]
+            removed += len(entries) - len(kept)
+            if kept:
+                self.index[key] = kept
+            else:
+                del self.index[key]
+        return removed
+
+    def crossed(self, country, fuel, old, new):
+        """Subscriptions whose threshold the EUR price crossed going from `old` to `new`"""
+        if old is None or new is None or old == new:
+            return []
+        if new < old:  # Fell: "below" thresholds with new < threshold <= old
+            entries = self.index.get((country, fuel, "below"), [])
+            lo = bisect.bisect_right(entries, (new, math.inf))
+            hi = bisect.bisect_right(entries, (old, math.inf))
+        else:  # Rose: "above" thresholds with old <= threshold < new
+            entries = self.index.get((country, fuel, "above"), [])
+            lo = bisect.bisect_left(entries, (old,))
+            hi = bisect.bisect_left(entries, (new,))
+        return [entry[2] for entry in entries[lo:hi]]
+
+
+subscriptions = SubscriptionStore(SUBSCRIPTIONS_FILE)
+subscriptions.load()
+
+
+def schedule_price_alerts(old, new):
+    """Notify subscribers about thresholds crossed between two snapshots, in the background"""
+    if not old or not subscriptions.index:
+        return  # No baseline after a cold start, nothing can have been crossed
+    alerts = []
+    for country, fuel, before, after in price_changes(old, new):
+        if before is None or after is None:
+            continue
+        for subscription in subscriptions.crossed(country, fuel, before.eur_amount, after.eur_amount):
+            # Each process only notifies the channels on its own shards
+            if bot.get_channel(subscription.channel_id) is not None:
+                alerts.append((subscription, after))
+    if alerts:
+        asyncio.get_running_loop().create_task(send_price_alerts(alerts))
+
+
+async def send_price_alerts(alerts):
+    """Post one message per channel mentioning every subscriber whose threshold was crossed"""
+    fuel_names = {"petrol": "бензин", "diesel": "дизель"}
+    by_channel = {}
+    for subscription, record in alerts:
+        word = "ниже" if subscription.direction == "below" else "выше"
+        by_channel.setdefault(subscription.channel_id, []).append(
+            f"<@{subscription.user_id}> 🔔 {COUNTRY_FLAGS.get(subscription.country, '🏳️')} {subscription.country}: "
+            f"{fuel_names[subscription.fuel]} {render_price(record)} — {word} €{subscription.threshold:g}")
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    sent = await asyncio.gather(*(send_to_channel(channel_id, None, semaphore, content="\n".join(lines)[:2000])
+                                  for channel_id, lines in by_channel.items()))
+    logger.info(f"Sent {len(alerts)} price alert(s) to {sum(sent)} of {len(by_channel)} channel(s)")
+
+
+# === Scheduler ===
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))  # minute, hour, day of month, month, day of week
+
+
+def parse_cron_field(field, low, high):
+    """Parse one cron field ("*", "*/5", "1-5", "0,30", "1-10/2") into a sorted tuple of values"""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/", 1)
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = end = int(part)
+        if step < 1 or start < low or end > high + (high == 6) or start > end:
+            raise ValueError(f"Invalid cron field: {field}")
+        values.update(range(start, end + 1, step))
+    if high == 6 and 7 in values:  # 7 is Sunday too
+        values.discard(7)
+        values.add(0)
+    return tuple(sorted(values))
+
+
+def parse_cron(expr):
+    """Parse a 5-field cron expression into (minutes, hours, days, months, weekdays, day_or)"""
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron expression must have 5 fields: {expr}")
+    parsed = tuple(parse_cron_field(f, low, high) for f, (low, high) in zip(fields, CRON_FIELDS))
+    # Like cron: when both day fields are restricted, a day matches if either does
+    day_or = fields[2] != "*" and fields[4] != "*"
+    return parsed + (day_or,)
+
+
+def cron_day_matches(cron, day):
+    minutes, hours, days, months, weekdays, day_or = cron
+    if day.month not in months:
+        return False
+    dom = day.day in days
+    dow = (day.weekday() + 1) % 7 in weekdays  # cron counts from Sunday
+    return (dom or dow) if day_or else (dom and dow)
+
+
+def next_run(cron, after, tz):
+    """First time strictly after `after` (aware datetime) matching a parsed cron expression, in tz"""
+    minutes, hours = cron[0], cron[1]
+    local_after = after.astimezone(tz).replace(tzinfo=None)
+    day = local_after.date()
+
+    for _ in range(366 * 5):
+        if cron_day_matches(cron, day):
+            for hour in hours:
+                for minute in minutes:
+                    naive = datetime(day.year, day.month, day.day, hour, minute)
+                    if naive <= local_after:
+                        continue
+                    try:
+                        candidate = tz.localize(naive, is_dst=None)
+                    except pytz.NonExistentTimeError:
+                        continue  # Skipped by a DST jump
+                    except pytz.AmbiguousTimeError:
+                        candidate = tz.localize(naive, is_dst=False)
+                    if candidate > after:
+                        return candidate
+        day += timedelta(days=1)
+
+    raise ValueError("Cron expression never matches")
+
+
+class ScheduledJob:
+    """A named coroutine function run on a cron schedule"""
+
+    def __init__(self, name, cron, func):
+        self.name = name
+        self.expr = cron
+        self.cron = parse_cron(cron)
+        self.func = func
+        self.task = None  # Current run, used to prevent overlapping runs
+        self.last_success = None  # Due time of the last successful run
+
+
+class Scheduler:
+    """Runs jobs at their cron times in one timezone
+
+    Each job sleeps until its next due time instead of polling. A run that
+    is still going at the next due time makes that run skip. Runs that
+    were missed (process down, loop stalled, job failed while the gateway
+    was away) are caught up once on start and on catch_up().
+    """
+
+    def __init__(self, timezone, state_file, catchup):
+        self.tz = pytz.timezone(timezone)
+        self.state_file = state_file
+        self.catchup = timedelta(seconds=catchup)
+        self.jobs = {}
+        self._loops = []
+
+    def add_job(self, name, cron, func):
+        self.jobs[name] = ScheduledJob(name, cron, func)
+
+    def now(self):
+        return datetime.now(self.tz)
+
+    def load_state(self):
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, stamp in state.items():
+            if name in self.jobs:
+                self.jobs[name].last_success = datetime.fromisoformat(stamp)
+
+    def save_state(self):
+        state = {job.name: job.last_success.isoformat() for job in self.jobs.values() if job.last_success}
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(f"{self.state_file}.tmp", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(f"{self.state_file}.tmp", self.state_file)
+        except OSError as e:
+            logger.error(f"Failed to save scheduler state: {e}")
+
+    @property
+    def running(self):
+        return bool(self._loops)
+
+    def start(self):
+        """Start all job loops (no-op if already running)"""
+        if self.running:
+            return
+        self.load_state()
+        self.catch_up()
+        self._loops = [asyncio.create_task(self._job_loop(job)) for job in self.jobs.values()]
+        for job in self.jobs.values():
+            logger.info(f"Job {job.name} ({job.expr}) next run at {next_run(job.cron, self.now(), self.tz)}")
+
+    def stop(self):
+        for loop in self._loops:
+            loop.cancel()
+        self._loops = []
+
+    def catch_up(self):
+        """Run once every job whose last due time since its last success was missed"""
+        now = self.now()
+        for job in self.jobs.values():
+            if job.last_success is None:
+                continue
+            missed = None
+            due = next_run(job.cron, job.last_success, self.tz)
+            while due <= now:
+                missed = due
+                due = next_run(job.cron, due, self.tz)
+            if missed is not None and now - missed <= self.catchup:
+                logger.info(f"Catching up missed run of {job.name} due at {missed}")
+                self._trigger(job, missed)
+
+    def _trigger(self, job, due):
+        if job.task is not None and not job.task.done():
+            logger.warning(f"Job {job.name} is still running, skipping run due at {due}")
+            return
+        job.task = asyncio.create_task(self._run(job, due))
+
+    async def _run(self, job, due):
+        logger.info(f"Running job {job.name} (due at {due})")
+        try:
+            await job.func()
+        except Exception as e:
+            logger.error(f"Job {job.name} failed: {e}")
+            return
+        if job.last_success is None or due > job.last_success:
+            job.last_success = due
+            self.save_state()
+
+    async def _job_loop(self, job):
+        due = next_run(job.cron, self.now(), self.tz)
+        while True:
+            # Sleep in bounded steps so wall-clock adjustments are picked up
+            delay = (due - self.now()).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(min(delay, 3600))
+                continue
+            self._trigger(job, due)
+            # If the loop stalled past several due times, they collapse into this one run
+            due = next_run(job.cron, max(due, self.now()), self.tz)
+
+
 def in_correct_text_channel():
     """Проверка, что команда используется в нужном текстовом канале"""
     async def predicate(interaction: discord.Interaction):
-        if interaction.channel_id == TEXT_CHANNEL_ID:
+        config = guild_configs.get(interaction.guild_id)
+        if config and interaction.channel_id == config.text_channel_id:
             return True
-        await interaction.response.send_message(
-            f"❌ Эта команда доступна только в текстовом канале <#{TEXT_CHANNEL_ID}>!",
-            ephemeral=True
-        )
+        if config:
+            message = f"❌ Эта команда доступна только в текстовом канале <#{config.text_channel_id}>!"
+        else:
+            message = "❌ Бот не настроен на этом сервере. Администратор может выполнить /setup."
+        await interaction.response.send_message(message, ephemeral=True)
         return False
     return app_commands.check(predicate)
     
     
 # Removed auto-reconnection loop to prevent constant reconnection issues
 
-@tasks.loop(minutes=1)
-async def midnight_task():
-    """Task that runs at midnight Moscow time"""
-    tz = pytz.timezone("Europe/Moscow")
-    now = datetime.now(tz)
-    if now.hour == 0 and now.minute == 0 and now.second < 30:
-        logger.info("Midnight task triggered")
-        await asyncio.sleep(15)  # Wait a bit to ensure proper execution
-        await update_prices()
-        channel = bot.get_channel(TEXT_CHANNEL_ID)
-        if channel:
-            await send_prices(channel, new_message=True)
-            await play_sound()
+async def refresh_job():
+    """Scheduled price refresh"""
+    await update_prices()
+
+
+async def broadcast_job():
+    """Scheduled post of the prices with the notification sound"""
+    # Shares the refresh scheduled for the same minute, or reuses one that just finished
+    await update_prices(max_age=BROADCAST_MAX_AGE)
+    if local_guild_configs() and await broadcast_changes() == 0:
+        raise RuntimeError("No text channel is available")  # Retried by catch_up after reconnect
+
+
+async def warm_cache_job():
+    """Re-render hot embeds that were evicted from the cache"""
+    for liters in HOT_LITERS:
+        get_prices_embed(liters)
+
+
+scheduler = Scheduler(SCHEDULE_TIMEZONE, SCHEDULER_STATE_FILE, SCHEDULE_CATCHUP)
+scheduler.add_job("refresh", SCHEDULE["refresh"], refresh_job)
+scheduler.add_job("broadcast", SCHEDULE["broadcast"], broadcast_job)
+scheduler.add_job("warm-cache", SCHEDULE["warm-cache"], warm_cache_job)
 
 
 @bot.tree.command(name="price", description="Узнать стоимость топлива на выбранное количество литров")
@@ -432,6 +1333,7 @@ async def midnight_task():
 @in_correct_text_channel()
 async def price(interaction: discord.Interaction, liters: float):
     """Slash command to get fuel prices"""
+    started = time.perf_counter()
     if liters <= 0:
         await interaction.response.send_message("Количество литров должно быть больше 0!", ephemeral=True)
         return
@@ -444,7 +1346,8 @@ async def price(interaction: discord.Interaction, liters: float):
 
     try:
         await send_prices(interaction.followup, liters=liters, new_message=True)
-        await play_sound()
+        PRICE_COMMAND_DURATION.observe(time.perf_counter() - started)
+        await play_sound(interaction.guild_id)
     except Exception as e:
         logger.error(f"Error in price command: {e}")
         await interaction.followup.send("Произошла ошибка при получении цен на топливо.")
@@ -459,45 +1362,287 @@ async def update_command(interaction: discord.Interaction):
     try:
         await update_prices()
         await send_prices(interaction.followup, new_message=True)
-        await play_sound()
+        await play_sound(interaction.guild_id)
     except Exception as e:
         logger.error(f"Error in update command: {e}")
         await interaction.followup.send("Произошла ошибка при обновлении цен.")
 
 
+@bot.tree.command(name="compare", description="Сравнить стоимость топлива по странам в выбранной валюте")
+@app_commands.describe(liters="Количество литров через запятую, например 1, 10, 40",
+                       currency="Код валюты, например EUR, USD, CZK")
+@in_correct_text_channel()
+async def compare_command(interaction: discord.Interaction, liters: str = "1, 10, 40, 50", currency: str = "EUR"):
+    """Slash command to compare fuel costs for several liters values in one currency"""
+    try:
+        liters_values = parse_liters_list(liters)
+    except ValueError:
+        await interaction.response.send_message(
+            f"Укажите от 1 до {COMPARE_MAX_LITERS} значений литров от 0 до 1000 через запятую.", ephemeral=True)
+        return
+
+    currency = currency.strip().upper()
+    # Checked before defer(): only the first response can be ephemeral. Followers never
+    # fetch rates themselves, take the ones the leader stored
+    await asyncio.to_thread(fx_rates.load)
+    if fx_rates.eur_rate(currency) is None:
+        await interaction.response.send_message(f"Неизвестная валюта: {currency}", ephemeral=True)
+        return
+
+    await interaction.response.defer()
+
+    try:
+        await fx_rates.refresh()
+        await interaction.followup.send(embed=build_compare_embed(liters_values, currency))
+    except KeyError:
+        # The refreshed table no longer has the currency
+        await interaction.followup.send(f"Неизвестная валюта: {currency}")
+    except Exception as e:
+        logger.error(f"Error in compare command: {e}")
+        await interaction.followup.send("Произошла ошибка при сравнении цен.")
+
+
+@compare_command.autocomplete("currency")
+async def compare_currency_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.upper()
+    return [app_commands.Choice(name=code, value=code) for code in fx_rates.currencies() if code.startswith(current)][:25]
+
+
+@bot.tree.command(name="history", description="История цен на топливо за период")
+@app_commands.describe(country="Страна", fuel="Вид топлива", period="Период")
+@app_commands.choices(
+    fuel=[app_commands.Choice(name="Бензин", value="petrol"), app_commands.Choice(name="Дизель", value="diesel")],
+    period=[app_commands.Choice(name=name, value=name) for name in HISTORY_RANGES],
+)
+@in_correct_text_channel()
+async def history_command(interaction: discord.Interaction, country: str, fuel: str, period: str = "30d"):
+    """Slash command to show min, max, average and trend of a price over a period"""
+    if country not in COUNTRIES:
+        await interaction.response.send_message(f"Неизвестная страна: {country}", ephemeral=True)
+        return
+
+    days = HISTORY_RANGES.get(period, 30)
+    try:
+        summary = history.summary(country, fuel, time.time() - days * 86400, history_period_for(days))
+    except sqlite3.Error as e:
+        logger.error(f"Error in history command: {e}")
+        await interaction.response.send_message("Произошла ошибка при чтении истории цен.", ephemeral=True)
+        return
+
+    fuel_name = "Бензин" if fuel == "petrol" else "Дизель"
+    flag = COUNTRY_FLAGS.get(country, "🏳️")
+    embed = discord.Embed(title=f"📈 {flag} {country}: {fuel_name} за {period}", color=0x00ffcc)
+    if summary is None:
+        embed.description = "Нет данных за этот период"
+    else:
+        change = summary["last"] - summary["first"]
+        percent = change / summary["first"] * 100 if summary["first"] else 0.0
+        arrow = "📈" if change > 0 else "📉" if change < 0 else "➡️"
+        embed.add_field(name="Минимум", value=f"€{summary['min']:.3f}")
+        embed.add_field(name="Максимум", value=f"€{summary['max']:.3f}")
+        embed.add_field(name="Среднее", value=f"€{summary['avg']:.3f}")
+        embed.add_field(name="Тренд", value=f"{arrow} {change:+.3f} € ({percent:+.1f}%)", inline=False)
+        embed.set_footer(text=f"{summary['samples']} замеров с "
+                              f"{datetime.fromtimestamp(summary['first_ts'], history.tz):%Y-%m-%d}")
+    await interaction.response.send_message(embed=embed)
+
+
+@history_command.autocomplete("country")
+async def history_country_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=country, value=country)
+            for country in COUNTRIES if current.lower() in country.lower()][:25]
+
+
+@bot.tree.command(name="subscribe", description="Уведомить, когда цена топлива пересечёт порог (в евро)")
+@app_commands.describe(country="Страна", fuel="Вид топлива", threshold="Порог цены за литр, €",
+                       direction="Когда цена станет ниже или выше порога")
+@app_commands.choices(
+    fuel=[app_commands.Choice(name="Бензин", value="petrol"), app_commands.Choice(name="Дизель", value="diesel")],
+    direction=[app_commands.Choice(name="Ниже порога", value="below"),
+               app_commands.Choice(name="Выше порога", value="above")],
+)
+@in_correct_text_channel()
+async def subscribe_command(interaction: discord.Interaction, country: str, fuel: str, threshold: float,
+                            direction: str = "below"):
+    """Slash command to add a price alert"""
+    if country not in COUNTRIES:
+        await interaction.response.send_message(f"Неизвестная страна: {country}", ephemeral=True)
+        return
+    if not 0 < threshold <= 100 or direction not in ALERT_DIRECTIONS:
+        await interaction.response.send_message("Порог должен быть от 0 до 100 €.", ephemeral=True)
+        return
+
+    try:
+        added = subscriptions.add(Subscription(interaction.user.id, interaction.channel_id, country, fuel, direction,
+                                               round(threshold, 3)), limit=SUBSCRIPTIONS_PER_USER)
+    except OSError as e:
+        logger.error(f"Failed to save subscriptions: {e}")
+        await interaction.response.send_message("Не удалось сохранить подписку.", ephemeral=True)
+        return
+    if not added:
+        await interaction.response.send_message(
+            f"Не больше {SUBSCRIPTIONS_PER_USER} уведомлений на пользователя.", ephemeral=True)
+        return
+
+    fuel_name = "бензин" if fuel == "petrol" else "дизель"
+    word = "ниже" if direction == "below" else "выше"
+    await interaction.response.send_message(
+        f"🔔 Уведомлю здесь, когда {fuel_name} в {country} станет {word} €{threshold:g}.", ephemeral=True)
+
+
+@subscribe_command.autocomplete("country")
+async def subscribe_country_autocomplete(interaction: discord.Interaction, current: str):
+    return await history_country_autocomplete(interaction, current)
+
+
+@bot.tree.command(name="unsubscribe", description="Отменить уведомления о ценах")
+@app_commands.describe(country="Страна (по умолчанию все)", fuel="Вид топлива (по умолчанию оба)")
+@app_commands.choices(
+    fuel=[app_commands.Choice(name="Бензин", value="petrol"), app_commands.Choice(name="Дизель", value="diesel")],
+)
+async def unsubscribe_command(interaction: discord.Interaction, country: str = None, fuel: str = None):
+    """Slash command to remove the user's price alerts"""
+    try:
+        removed = subscriptions.remove(interaction.user.id, country, fuel)
+    except OSError as e:
+        logger.error(f"Failed to save subscriptions: {e}")
+        await interaction.response.send_message("Не удалось сохранить изменения.", ephemeral=True)
+        return
+    await interaction.response.send_message(f"Удалено уведомлений: {removed}.", ephemeral=True)
+
+
+@unsubscribe_command.autocomplete("country")
+async def unsubscribe_country_autocomplete(interaction: discord.Interaction, current: str):
+    return await history_country_autocomplete(interaction, current)
+
+
+@bot.tree.command(name="setup", description="Настроить бота для этого сервера")
+@app_commands.describe(voice_channel="Голосовой канал для звуковых уведомлений")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+async def setup_command(interaction: discord.Interaction, voice_channel: discord.VoiceChannel = None):
+    """Slash command to use the current text channel (and a voice channel) in this guild"""
+    config = GuildConfig(interaction.guild_id, interaction.channel_id, voice_channel.id if voice_channel else None)
+    try:
+        guild_configs.set(config)
+    except OSError as e:
+        logger.error(f"Failed to save guild config: {e}")
+        await interaction.response.send_message("Не удалось сохранить настройки.", ephemeral=True)
+        return
+
+    voice = f", голосовой канал <#{voice_channel.id}>" if voice_channel else ""
+    await interaction.response.send_message(f"✅ Текстовый канал <#{interaction.channel_id}>{voice}.", ephemeral=True)
+    if voice_channel:
+        await connect_voice(config)
+
+
+def command_tree_hash(guild=None):
+    """Hash of the command payload Discord would receive for a scope"""
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands(guild=guild)]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def load_command_hashes():
+    try:
+        with open(COMMAND_SYNC_STATE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_command_hashes(hashes):
+    try:
+        os.makedirs(os.path.dirname(COMMAND_SYNC_STATE) or ".", exist_ok=True)
+        with open(f"{COMMAND_SYNC_STATE}.tmp", "w", encoding="utf-8") as f:
+            json.dump(hashes, f)
+        os.replace(f"{COMMAND_SYNC_STATE}.tmp", COMMAND_SYNC_STATE)
+    except OSError as e:
+        logger.error(f"Failed to save command sync state: {e}")
+
+
+async def sync_commands():
+    """Sync the global command tree if it changed since the last sync
+
+    Global commands reach every guild, including new ones that have not
+    run /setup yet.
+    """
+    hashes = load_command_hashes()
+    digest = command_tree_hash()
+    if hashes.get("global") != digest:
+        try:
+            synced = await bot.tree.sync()
+            hashes["global"] = digest
+            logger.info(f"Глобально синхронизировано {len(synced)} команд: {[cmd.name for cmd in synced]}")
+        except Exception as global_error:
+            logger.error(f"Ошибка глобальной синхронизации: {global_error}")
+
+    # Earlier versions synced guild copies of every command (GUILD_ID, then each configured
+    # guild), which show up twice next to the global ones. Those versions kept no hashes, so
+    # a guild without one is synced with its (empty) guild tree once to remove the copies
+    guild_ids = {config.guild_id for config in local_guild_configs()}
+    if bot.get_guild(GUILD_ID) is not None:
+        guild_ids.add(GUILD_ID)
+    for guild_id in sorted(guild_ids):
+        key = str(guild_id)
+        digest = command_tree_hash(discord.Object(id=guild_id))
+        if hashes.get(key) == digest:
+            continue
+        try:
+            await bot.tree.sync(guild=discord.Object(id=guild_id))
+            hashes[key] = digest
+            logger.info(f"Удалены копии команд для гильдии {guild_id}")
+        except Exception as sync_error:
+            logger.error(f"Ошибка синхронизации для гильдии {guild_id}: {sync_error}")
+    save_command_hashes(hashes)
+
+
+async def initial_refresh():
+    """First scrape after start, in the background so commands answer from the stored snapshot meanwhile"""
+    try:
+        await update_prices()
+        await broadcast_changes()
+    except Exception as e:
+        logger.error(f"Initial price refresh failed: {e}")
+
+
+_started = False  # on_ready also fires after gateway reconnects
+
+
 @bot.event
 async def on_ready():
     """Bot ready event"""
+    global _started
     try:
+        if _started:
+            logger.info(f"Бот {bot.user} переподключился")
+            # Догоняем пропущенные запуски расписания и возвращаемся в голосовые каналы
+            scheduler.catch_up()
+            await connect_all_voice()
+            return
+        _started = True
+
         logger.info(f"Бот {bot.user} запущен! ID: {bot.user.id}")
 
-        # Синхронизация команд
-        try:
-            # Сначала синхронизируем для гильдии
-            bot.tree.copy_global_to(guild=discord.Object(id=GUILD_ID))
-            synced = await bot.tree.sync(guild=discord.Object(id=GUILD_ID))
-            logger.info(f"Синхронизировано {len(synced)} команд: {[cmd.name for cmd in synced]}")
-        except Exception as sync_error:
-            logger.error(f"Ошибка синхронизации для гильдии: {sync_error}")
-            # Попробуем глобальную синхронизацию
-            try:
-                synced = await bot.tree.sync()
-                logger.info(f"Глобально синхронизировано {len(synced)} команд")
-            except Exception as global_error:
-                logger.error(f"Ошибка глобальной синхронизации: {global_error}")
+        # Последний сохранённый снимок цен: /price отвечает сразу, не дожидаясь сбора цен
+        start_snapshot_sync()
 
-        # Подключение к голосовому каналу
-        await connect_voice()
+        # Синхронизация команд (только если команды изменились)
+        await sync_commands()
 
-        # Запуск задачи
-        midnight_task.start()
+        # Эндпоинт метрик
+        await start_metrics_server()
 
-        # Первоначальная загрузка цен
-        await update_prices()
-        channel = bot.get_channel(TEXT_CHANNEL_ID)
-        if channel:
-            await send_prices(channel, new_message=True)
-            await play_sound()
+        # Подготовка звука
+        await load_sound()
+
+        # Подключение к голосовым каналам
+        await connect_all_voice()
+
+        # Запуск расписания (догоняет запуски, пропущенные пока бот был выключен)
+        scheduler.start()
+
+        # Обновление цен в фоне
+        asyncio.create_task(initial_refresh())
 
         logger.info("Бот полностью готов к работе!")
 
@@ -509,9 +1654,10 @@ async def on_ready():
 async def on_voice_state_update(member, before, after):
     """Handle voice state updates"""
     if member.id == bot.user.id:
-        if after.channel is None or after.channel.id != VOICE_CHANNEL_ID:
+        config = guild_configs.get(member.guild.id)
+        if config and config.voice_channel_id and (after.channel is None or after.channel.id != config.voice_channel_id):
             await asyncio.sleep(2)
-            await connect_voice()
+            await connect_voice(config)
 
 
 @bot.event
@@ -520,21 +1666,25 @@ async def on_error(event, *args, **kwargs):
     logger.error(f"Error in event {event}: {args}")
 
 
-if __name__ == "__main__":
-    try:
-        bot.run(TOKEN)
-    except Exception as e:
-        logger.error(f"Failed to start bot: {e}")
-
 @bot.command()
 @commands.is_owner()
 async def sync(ctx):
     """Принудительная синхронизация команд"""
     try:
         synced = await bot.tree.sync()
+        hashes = load_command_hashes()
+        hashes["global"] = command_tree_hash()
+        save_command_hashes(hashes)
         await ctx.send(f"Синхронизировано {len(synced)} команд: {[cmd.name for cmd in synced]}")
         logger.info(f"Синхронизировано команд: {len(synced)}")
     except Exception as e:
         await ctx.send(f"Ошибка синхронизации: {e}")
         logger.error(f"Sync error: {e}")
 
+
+if __name__ == "__main__":
+    try:
+        # discord.py logs through setup_logging, its own handler would print everything twice
+        bot.run(TOKEN, log_handler=None)
+    except Exception as e:
+        logger.error(f"Failed to start bot: {e}")
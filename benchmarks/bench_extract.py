@@ -0,0 +1,62 @@
+"""Benchmark price extraction on the synthetic fixture pages.
+
+Compares the old re.search cascade over the whole page with the
+precompiled, section-anchored engine (extract_prices) and checks that
+both produce the same prices.
+
+Usage: python benchmarks/bench_extract.py [repeat]
+"""
+import re
+import sys
+import timeit
+
+from common import core, load_fixture
+
+
+def legacy_extract(country, text):
+    """The extraction loop as it was before the engine: one re.search per pattern on the full page"""
+    patterns = core.get_country_patterns(country)
+    result = {}
+    for fuel in core.FUEL_TYPES:
+        result[fuel] = None
+        for i, pattern in enumerate(patterns[fuel]):
+            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+            if match:
+                result[fuel] = core.format_price(country, fuel, match, pattern, i)
+                break
+    return result
+
+
+def engine_extract(country, text):
+    result = {}
+    for fuel, found in core.extract_prices(country, text).items():
+        result[fuel] = core.format_price(country, fuel, found[2], found[1], found[0]) if found else None
+    return result
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    total_legacy = total_engine = 0.0
+
+    print(f"{'country':<10} {'size':>8} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8}")
+    for country in core.COUNTRIES:
+        text = load_fixture(country)
+
+        legacy = legacy_extract(country, text)
+        engine = engine_extract(country, text)
+        if legacy != engine:
+            raise SystemExit(f"{country}: results differ: {legacy} != {engine}")
+
+        t_legacy = min(timeit.repeat(lambda: legacy_extract(country, text), number=1, repeat=repeat))
+        t_engine = min(timeit.repeat(lambda: engine_extract(country, text), number=1, repeat=repeat))
+        total_legacy += t_legacy
+        total_engine += t_engine
+        print(f"{country:<10} {len(text):>8} {t_legacy * 1000:>10.3f} {t_engine * 1000:>10.3f} "
+              f"{t_legacy / t_engine:>7.1f}x")
+
+    print(f"{'total':<10} {'':>8} {total_legacy * 1000:>10.3f} {total_engine * 1000:>10.3f} "
+          f"{total_legacy / total_engine:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Measure the logging cost a refresh puts on the event loop thread.
+
+Replays the log calls of one refresh (fetch and per-fuel extraction
+records for every fixture country) REFRESHES times against:
+
+  legacy   the old setup: f-strings and a StreamHandler writing on the
+           calling thread (logging.basicConfig)
+  queue    the bot's pipeline: lazy %-formatting and LocalQueueHandler, the
+           QueueListener thread formats and writes
+  sampled  queue with LOG_SAMPLE_RATE=0.1 on the scrape logger
+
+Each mode runs with a fast sink (a temporary file) and a slow one that
+takes SLOW_WRITE seconds per write, like a congested pipe to a log
+collector. Only time spent on the calling thread is counted; the
+listener drains the queue afterwards. The "info off" rows run at
+WARNING, where lazy arguments are never formatted at all.
+
+Usage: python benchmarks/bench_logging.py [refreshes]
+"""
+import logging
+import logging.handlers
+import queue
+import sys
+import tempfile
+import time
+
+from common import core, load_fixture
+
+REFRESHES = 200
+SLOW_WRITE = 0.0002
+
+
+class SlowStream:
+    """File-like sink that blocks on every write"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        time.sleep(SLOW_WRITE)
+        self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def legacy_refresh(log, results):
+    for country, extracted in results.items():
+        log.info(f"Fetching prices for {country}")
+        log.info(f"Successfully fetched data for {country}")
+        for fuel, (i, groups, record) in extracted.items():
+            log.info(f"{country} {fuel} found with pattern {i + 1}: {core.render_price(record)} (groups: {groups})")
+
+
+def lazy_refresh(log, scrape_log, results):
+    for country, extracted in results.items():
+        scrape_log.info("Fetching prices for %s", country, extra={"country": country})
+        scrape_log.info("Successfully fetched data for %s", country, extra={"country": country, "status": 200})
+        for fuel, (i, groups, record) in extracted.items():
+            scrape_log.info("%s %s found with pattern %d: %s", country, fuel, i + 1, record,
+                            extra={"country": country, "fuel": fuel, "pattern": i + 1})
+            scrape_log.debug("%s %s groups: %s", country, fuel, groups)
+
+
+def configure(mode, stream, level):
+    """Fresh loggers for one run, returns (logger, scrape logger, listener or None)"""
+    root = logging.getLogger("bench")
+    scrape = logging.getLogger("bench.scrape")
+    for log in (root, scrape):
+        log.handlers[:] = []
+        log.filters[:] = []
+    root.propagate = False
+    root.setLevel(level)
+
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(core.LOG_TEXT_FORMAT))
+    if mode == "legacy":
+        root.addHandler(handler)
+        return root, scrape, None
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(core.LocalQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    if mode == "sampled":
+        scrape.addFilter(core.SamplingFilter(0.1))
+    return root, scrape, listener
+
+
+def run(mode, stream, level, results, refreshes):
+    log, scrape, listener = configure(mode, stream, level)
+    start = time.perf_counter()
+    for _ in range(refreshes):
+        if mode == "legacy":
+            legacy_refresh(log, results)
+        else:
+            lazy_refresh(log, scrape, results)
+    elapsed = time.perf_counter() - start
+    if listener is not None:
+        listener.stop()
+    return elapsed / refreshes
+
+
+def main():
+    refreshes = int(sys.argv[1]) if len(sys.argv) > 1 else REFRESHES
+    logging.getLogger().setLevel(logging.CRITICAL)
+    core.EXTRACT_EXECUTOR = "inline"
+    results = {}
+    for country in core.COUNTRIES:
+        extracted, _ = core.extract_page_prices(country, load_fixture(country))
+        results[country] = {fuel: found for fuel, found in extracted.items() if found is not None}
+
+    print(f"{refreshes} refreshes, {len(results)} countries; time on the calling thread per refresh")
+    print(f"{'sink':<6} {'level':<9} {'legacy':>10} {'queue':>10} {'sampled':>10}")
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as sink:
+        for sink_name, stream in (("file", sink), ("slow", SlowStream(sink))):
+            for level_name, level in (("info", logging.INFO), ("info off", logging.WARNING)):
+                timings = [run(mode, stream, level, results, refreshes) for mode in ("legacy", "queue", "sampled")]
+                print(f"{sink_name:<6} {level_name:<9} " + " ".join(f"{t * 1e6:>8.1f}us" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Measure event loop lag while extracting prices from a pathological page.
+
+A ticker coroutine sleeps 10 ms in a loop and records how late it wakes
+up; meanwhile parse_country_prices_async runs on the pathological
+fixture with each EXTRACT_EXECUTOR mode. Inline extraction blocks the
+loop (and with it Discord heartbeats and voice) for the whole scan.
+Thread pools help only partly, because the regex engine holds the
+GIL for long stretches. A process pool keeps the lag at timer resolution,
+and the CPU budget caps how long the page may take.
+
+Usage: python benchmarks/bench_loop_lag.py [budget_seconds]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+from common import core, pathological_page
+
+TICK = 0.01
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def run(mode, text):
+    core.EXTRACT_EXECUTOR = mode
+    core.reset_extract_pool()
+    pool = core.get_extract_pool()
+    if pool is not None:  # Start the workers before measuring
+        await asyncio.get_running_loop().run_in_executor(pool, core.extract_page_prices, "Германия", "", None)
+
+    lags, stop = [], asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK * 3)
+    start = time.perf_counter()
+    try:
+        await core.parse_country_prices_async("Украина", text)
+        outcome = "done"
+    except core.ExtractionBudgetExceeded:
+        outcome = "budget exceeded"
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    core.reset_extract_pool()
+    print(f"{mode:<8} {elapsed * 1000:>10.0f} ms {max(lags) * 1000:>12.1f} ms   {outcome}")
+
+
+async def main():
+    logging.getLogger().setLevel(logging.CRITICAL)
+    if len(sys.argv) > 1:
+        core.EXTRACT_CPU_BUDGET = float(sys.argv[1])
+    text = pathological_page()
+    print(f"CPU budget {core.EXTRACT_CPU_BUDGET}s")
+    print(f"{'mode':<8} {'extraction':>13} {'max loop lag':>15}")
+    for mode in ("inline", "thread", "process"):
+        await run(mode, text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
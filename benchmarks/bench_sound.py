@@ -0,0 +1,65 @@
+"""Measure time-to-first-packet of the notification sound.
+
+Compares the old path (a new FFmpegPCMAudio per play: spawn ffmpeg,
+decode, then Opus-encode the first frame) with the pre-encoded
+in-memory BufferedOpusAudio. Needs ffmpeg on PATH and libopus for the
+encoder step of the old path.
+
+Usage: python benchmarks/bench_sound.py [repeat]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import discord
+
+from common import REPO_DIR
+
+import FT  # noqa: E402
+
+SOUND_PATH = os.path.join(REPO_DIR, FT.SOUND_FILE)
+
+
+def first_packet_ffmpeg(encoder):
+    start = time.perf_counter()
+    source = discord.FFmpegPCMAudio(SOUND_PATH)
+    try:
+        pcm = source.read()
+        if encoder is not None:
+            encoder.encode(pcm, encoder.SAMPLES_PER_FRAME)
+        return time.perf_counter() - start
+    finally:
+        source.cleanup()
+
+
+def first_packet_buffered(packets):
+    start = time.perf_counter()
+    FT.BufferedOpusAudio(packets).read()
+    return time.perf_counter() - start
+
+
+def report(name, samples):
+    print(f"{name:<22} median {statistics.median(samples) * 1000:9.3f} ms   max {max(samples) * 1000:9.3f} ms")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    start = time.perf_counter()
+    packets = asyncio.run(FT.encode_opus_packets(SOUND_PATH))
+    print(f"one-off transcode: {(time.perf_counter() - start) * 1000:.1f} ms, {len(packets)} frames")
+
+    try:
+        encoder = discord.opus.Encoder()
+    except discord.opus.OpusNotLoaded:
+        encoder = None
+        print("libopus not loaded, old path is measured without the encode step")
+
+    report("FFmpegPCMAudio", [first_packet_ffmpeg(encoder) for _ in range(repeat)])
+    report("BufferedOpusAudio", [first_packet_buffered(packets) for _ in range(repeat)])
+
+
+if __name__ == "__main__":
+    main()
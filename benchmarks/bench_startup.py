@@ -0,0 +1,57 @@
+"""Compare cold-start time of the headless scraper with the Discord bot module.
+
+Each command runs in a fresh interpreter (bytecode caches warm, as on a
+deployed host) with FT_DATA_DIR pointing at an empty temporary directory:
+
+  python       bare interpreter start, the floor for every row
+  fuel_core    import fuel_core (no discord.py, aiohttp not loaded yet)
+  cli --help   python fuel_core.py --help
+  FT           import FT (discord.py, aiohttp, the bot and its commands)
+
+Usage: python benchmarks/bench_startup.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import REPO_DIR
+
+RUNS = 10
+
+
+def time_command(args, runs):
+    """Best and median wall time of a command, seconds"""
+    samples = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, FT_DATA_DIR=data_dir, METRICS_PORT="0")
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(args, cwd=REPO_DIR, env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - start)
+    return {"seconds": min(samples), "median": statistics.median(samples), "repeat": runs}
+
+
+def cold_import(module, runs):
+    return time_command([sys.executable, "-c", f"import {module}"], runs)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    commands = {
+        "python": [sys.executable, "-c", "pass"],
+        "fuel_core": [sys.executable, "-c", "import fuel_core"],
+        "cli --help": [sys.executable, "fuel_core.py", "--help"],
+        "FT": [sys.executable, "-c", "import FT"],
+    }
+    print(f"{'command':<12} {'best':>10} {'median':>10}   ({runs} runs)")
+    for name, args in commands.items():
+        result = time_command(args, runs)
+        print(f"{name:<12} {result['seconds'] * 1000:>8.0f}ms {result['median'] * 1000:>8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare streamed #fuel-section parsing with full-page parsing.
+
+Fetches every fixture from the local stub server twice: with
+fetch_page(section_only=True), the path fetch_country_price uses, and
+with the full body. It checks that the extracted prices are identical
+and reports bytes read, time to result and peak traced memory. The stub
+sends the body in chunks with a pause between them to show the effect
+of stopping early.
+
+Usage: python benchmarks/bench_stream.py [chunk_delay_seconds]
+"""
+import asyncio
+import logging
+import sys
+import time
+import tracemalloc
+
+from common import core
+from stub_server import StubServer
+
+
+async def fetch_and_parse(session, country, url, section_only):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    status, text, _ = await core.fetch_page(session, country, url, section_only=section_only)
+    prices = core.parse_country_prices(country, text)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - before
+    return prices, elapsed, peak
+
+
+async def main(chunk_delay):
+    logging.getLogger().setLevel(logging.ERROR)
+    server = StubServer(chunk_delay=chunk_delay)
+    urls = server.urls(await server.start())
+    session = core.get_http_session()
+    tracemalloc.start()
+
+    print(f"{'country':<10} {'full ms':>9} {'stream ms':>10} {'full KiB':>9} {'stream KiB':>11} "
+          f"{'full peak':>10} {'stream peak':>12}")
+    try:
+        for country in core.COUNTRIES:
+            bytes_before = core.FETCH_BYTES.values.get((country,), 0)
+            full, t_full, m_full = await fetch_and_parse(session, country, urls[country], False)
+            bytes_full = core.FETCH_BYTES.values[(country,)] - bytes_before
+            stream, t_stream, m_stream = await fetch_and_parse(session, country, urls[country], True)
+            bytes_stream = core.FETCH_BYTES.values[(country,)] - bytes_before - bytes_full
+            if full != stream:
+                raise SystemExit(f"{country}: results differ: {full} != {stream}")
+            print(f"{country:<10} {t_full * 1000:>9.1f} {t_stream * 1000:>10.1f} {bytes_full / 1024:>9.0f} "
+                  f"{bytes_stream / 1024:>11.0f} {m_full / 1024:>8.0f}Ki {m_stream / 1024:>10.0f}Ki")
+    finally:
+        tracemalloc.stop()
+        await core.close_http_session()
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 0.01))
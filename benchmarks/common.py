@@ -0,0 +1,47 @@
+"""Shared helpers for the benchmarks: repo import path and HTML fixtures."""
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+sys.path.insert(0, REPO_DIR)
+
+import fuel_core as core  # noqa: E402
+
+# Rows that never complete a price: every "АИ-95</span>" start makes the
+# Ukrainian lazy .*? patterns rescan the rest of the section, roughly O(n^4)
+PATHOLOGICAL_ROW = ('<tr><td><span class="fuel-name">АИ-95</span></td>'
+                    '<td>UAH <span class="price">н/д</span> (€ н/д)</td></tr>\n')
+PATHOLOGICAL_ROWS = 32  # ~1 s of extraction on a desktop CPU
+
+
+def url_slug(country):
+    """URL path slug of a country (russia, germany, ...)"""
+    return core.URLS[country].split("/")[3]
+
+
+def fixture_path(country):
+    """Synthetic page for a country (see fixtures/generate.py), named after its URL slug (russia.html, ...)"""
+    return os.path.join(FIXTURES_DIR, f"{url_slug(country)}.html")
+
+
+def load_fixture(country):
+    with open(fixture_path(country), encoding="utf-8") as f:
+        return f.read()
+
+
+def pathological_page(rows=PATHOLOGICAL_ROWS, filler_blocks=400):
+    """A large Ukrainian-style page whose fuel table triggers heavy backtracking
+
+    The filler before the table has no digits or punctuation and nothing
+    follows the table, so the cost is set by `rows` alone and the page
+    still finishes in bounded time.
+    """
+    words = "дорога граница трасса заправка маршрут водитель поездка город таможня паспорт".split()
+    filler = "\n".join(f"<p>{' '.join(words[(i + j) % len(words)] for j in range(40))}</p>"
+                       for i in range(filler_blocks))
+    return (f"<html><body><h1>Украина</h1>\n{filler}\n"
+            f'<h2 id="fuel">Цены на топливо</h2>\n<table class="fuel-table">\n'
+            f"{PATHOLOGICAL_ROW * rows}</table></body></html>")
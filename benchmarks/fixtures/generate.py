@@ -0,0 +1,126 @@
+"""Generate the synthetic country pages in this directory.
+
+The fixtures are not snapshots of autotraveler.ru: they are built to
+look like its country pages (menu, a large inline script, long article
+sections, a #fuel price table, comments) at a realistic size, with fuel
+names and currencies mentioned outside the table so that unanchored
+patterns have text to scan. Output is deterministic; rerun after
+changing this script and commit the regenerated pages:
+
+    python benchmarks/fixtures/generate.py
+"""
+import os
+import random
+
+FIXTURES_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED = 7
+
+WORDS = ("дорога граница трасса платная виньетка штраф парковка скорость камера заправка маршрут "
+         "автомобиль водитель страховка карта поездка отель город километр таможня паспорт "
+         "правила движения ограничение полиция эвакуатор сервис шины цепи зимой летом").split()
+UPDATED = '<p class="note">Дата обновления: 01.10.2026</p>'
+
+
+def paragraph(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def filler(rng, blocks, mention):
+    """Article blocks, every 7th one mentions fuel outside the price table"""
+    return "\n".join(
+        f'<div class="article-block"><h3>{paragraph(rng, 4)}</h3><p>{paragraph(rng, 60)}</p>'
+        f'<p>{paragraph(rng, 45)} {mention if i % 7 == 3 else ""}</p></div>'
+        for i in range(blocks))
+
+
+def page(rng, head, title, mention, section, comment_mention):
+    comments = "\n".join(
+        f'<div class="comment"><span class="author">user{i}</span>'
+        f'<p>{paragraph(rng, 30)} {comment_mention if i % 5 == 0 else ""}</p></div>'
+        for i in range(120))
+    nav = "\n".join(f'<li><a href="/{word}/">{word.capitalize()}</a></li>' for word in WORDS)
+    return f'''<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>{title}</title>
+<link rel="stylesheet" href="/css/main.css">{head}</head>
+<body><header><ul class="menu">{nav}</ul></header>
+<main><h1>{title}</h1>
+<h2 id="roads">Дороги</h2>
+{filler(rng, 60, mention)}
+{section}
+<h2 id="parking">Парковка</h2>
+{filler(rng, 60, mention)}
+<h2 id="comments">Комментарии</h2>
+{comments}
+</main><footer><p>© autotraveler.ru</p></footer></body></html>
+'''
+
+
+def row(name, body):
+    return f'<tr><td><span class="fuel-name">{name}</span></td><td>{body}</td></tr>'
+
+
+def local(currency, amount, eur, span=True):
+    """Local price with the EUR equivalent, Ukraine's table has no price span"""
+    if span:
+        return f'{currency} <span class="price">{amount}</span> (€ {eur})'
+    return f'{currency} {amount} (€ {eur})'
+
+
+def fuel_section(country, rows, intro=""):
+    table = f'<table class="fuel-table">{"".join(rows)}</table>'
+    return f'<h2 id="fuel">Цены на топливо в {country}</h2>\n{intro}{table}\n{UPDATED}'
+
+
+def generate():
+    """{slug: html} for every fixture page"""
+    rng = random.Random(SEED)
+    head = "<script>window.__DATA__ = {" + ",".join(f'"k{i}": "{rng.random():.6f}"' for i in range(800)) + "};</script>"
+    pages = {}
+    pages["russia"] = page(
+        rng, head, "Россия: правила для автотуристов",
+        "В России на трассах обычно продают АИ-92, АИ-95 и ДТ, рассчитаться можно в RUB.",
+        fuel_section("России", [
+            row("АИ-92", local("RUB", "52,10", "0.57")), row("АИ-95", local("RUB", "57,45", "0.63")),
+            row("АИ-98", local("RUB", "71,90", "0.79")), row("ДТ", local("RUB", "68,20", "0.75")),
+            row("Газ", local("RUB", "27,30", "0.30")),
+        ], intro="<p>Средние цены на АЗС по стране.</p>\n"),
+        "АИ-95 у нас дешевле, чем в €")
+    pages["germany"] = page(
+        rng, head, "Германия: правила для автотуристов",
+        "Бензин Super (95) и E10 на немецких заправках стоит в евро, дизель обычно дешевле.",
+        fuel_section("Германии", [
+            row("Super (95)", '€ <span class="price">1,799</span>'), row("E10", '€ <span class="price">1,739</span>'),
+            row("Super Plus (98)", '€ <span class="price">1,919</span>'),
+            row("Diesel", '€ <span class="price">1,659</span>'), row("LPG", '€ <span class="price">0,989</span>'),
+        ]),
+        "дизель по 1,6 евро")
+    pages["czech"] = page(
+        rng, head, "Чехия: правила для автотуристов",
+        "На чешских АЗС продают Natural 95 и Nafta, цены указаны в CZK.",
+        fuel_section("Чехии", [
+            row("Natural 95", local("CZK", "38,90", "1.55")), row("Natural 98", local("CZK", "42,50", "1.69")),
+            row("Nafta", local("CZK", "37,40", "1.49")), row("LPG", local("CZK", "17,90", "0.71")),
+        ]),
+        "Nafta дорогая, CZK")
+    pages["ukraine"] = page(
+        rng, head, "Украина: правила для автотуристов",
+        "В Украине бензин и дизель продают почти на всех заправках.",
+        fuel_section("Украине", [
+            row("АИ-92", local("UAH", "54,20", "1.19", span=False)),
+            row("АИ-95", local("UAH", "57,90", "1.27", span=False)),
+            row("ДТ", local("UAH", "55,10", "1.21", span=False)), row("Газ", local("UAH", "33,50", "0.74", span=False)),
+        ]),
+        "АИ-95 подорожал на 2 UAH")
+    return pages
+
+
+def main():
+    for slug, html in generate().items():
+        path = os.path.join(FIXTURES_DIR, f"{slug}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        print(f"{path}: {len(html.encode('utf-8'))} bytes")
+
+
+if __name__ == "__main__":
+    main()
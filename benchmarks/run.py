@@ -0,0 +1,178 @@
+"""Offline benchmark suite for the FT.py and fuel_core.py hot paths.
+
+Runs without the live site or a Discord token: pages are the synthetic
+ones in benchmarks/fixtures (built by fixtures/generate.py) and the
+fetch pipeline talks to a local stub server (stub_server.py) with
+injected latency and errors. Results are written as JSON; with
+--baseline the run fails when a benchmark got slower than the baseline
+by more than --tolerance.
+
+Usage: python benchmarks/run.py [--quick] [--output FILE] [--baseline FILE] [--tolerance 0.25]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from common import REPO_DIR, core, load_fixture, pathological_page, url_slug
+from bench_startup import cold_import
+from stub_server import StubServer
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.json")
+
+
+def measure(func, repeat, number=1):
+    """Best-of-repeat and median time per call of a synchronous function, seconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {"seconds": min(samples), "median": statistics.median(samples), "repeat": repeat, "number": number}
+
+
+def bench_extraction(results, repeat):
+    for country in core.COUNTRIES:
+        text = load_fixture(country)
+        results[f"extract.{url_slug(country)}"] = measure(lambda: core.extract_prices(country, text), repeat, 10)
+
+    text = pathological_page()
+    results["extract.pathological"] = measure(lambda: core.extract_prices("Украина", text), max(1, repeat // 10))
+
+
+def bench_format_price(results, repeat):
+    matches = []
+    for country in core.COUNTRIES:
+        for fuel, found in core.extract_prices(country, load_fixture(country)).items():
+            if found:
+                matches.append((country, fuel, found[2], found[1], found[0]))
+
+    def format_all():
+        for country, fuel, match, pattern, index in matches:
+            core.format_price(country, fuel, match, pattern, index)
+
+    results["format_price"] = measure(format_all, repeat, 1000)
+    results["format_price"]["calls"] = len(matches)
+
+
+def bench_embeds(results, repeat):
+    import FT  # Only this group needs discord.py
+    logging.getLogger().setLevel(logging.ERROR)  # FT's logging setup resets the level
+    FT.fuel_data = {country: core.parse_country_prices(country, load_fixture(country)) for country in core.COUNTRIES}
+    for liters in (1, 50):
+        results[f"embed.build.{liters}"] = measure(lambda: FT.build_prices_embed(liters), repeat, 100)
+    FT.invalidate_embeds()
+    results["embed.cached.50"] = measure(lambda: FT.get_prices_embed(50), repeat, 1000)
+
+
+def bench_startup(results, repeat):
+    results["startup.fuel_core"] = cold_import("fuel_core", repeat)
+    results["startup.FT"] = cold_import("FT", repeat)
+
+
+async def run_pipeline(server, repeat):
+    base = await server.start()
+    core.URLS.update(server.urls(base))
+    samples = []
+    try:
+        for _ in range(repeat):
+            core._response_cache.clear()
+            start = time.perf_counter()
+            data, _ = await core.fetch_fuel_prices()
+            samples.append(time.perf_counter() - start)
+        await core.close_http_session()
+    finally:
+        await server.stop()
+    found = sum(record is not None for prices in data.values() for record in prices.values())
+    return {"seconds": min(samples), "median": statistics.median(samples), "repeat": repeat,
+            "requests": server.requests, "errors": server.errors, "prices_found": found}
+
+
+def bench_pipeline(results, repeat):
+    urls, cache_dir, ttl = dict(core.URLS), core.HTTP_CACHE_DIR, core.CACHE_TTL
+    with tempfile.TemporaryDirectory() as tmp:
+        core.HTTP_CACHE_DIR, core.CACHE_TTL = tmp, 0
+        try:
+            scenarios = {
+                "pipeline.latency": StubServer(latency=0.2, jitter=0.1),
+                "pipeline.slow_country": StubServer(latency=0.1, slow={"germany": 1.0}),
+                "pipeline.errors": StubServer(latency=0.1, error_rate=0.2, seed=1),
+            }
+            for name, server in scenarios.items():
+                results[name] = asyncio.run(run_pipeline(server, repeat))
+        finally:
+            core.URLS.clear()
+            core.URLS.update(urls)
+            core.HTTP_CACHE_DIR, core.CACHE_TTL = cache_dir, ttl
+
+
+def compare(results, baseline, tolerance):
+    """Names of benchmarks slower than baseline * (1 + tolerance)"""
+    regressions = []
+    for name, base in baseline.get("results", {}).items():
+        current = results.get(name)
+        if current and current["seconds"] > base["seconds"] * (1 + tolerance):
+            regressions.append(f"{name}: {base['seconds'] * 1000:.3f} ms -> {current['seconds'] * 1000:.3f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the JSON results")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--only", help="comma-separated groups: extract,format,embed,pipeline,startup")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    repeat = 5 if args.quick else 20
+    groups = {
+        "extract": lambda r: bench_extraction(r, repeat),
+        "format": lambda r: bench_format_price(r, repeat),
+        "embed": lambda r: bench_embeds(r, repeat),
+        "pipeline": lambda r: bench_pipeline(r, 2 if args.quick else 5),
+        "startup": lambda r: bench_startup(r, 3 if args.quick else 10),
+    }
+    selected = args.only.split(",") if args.only else list(groups)
+
+    results = {}
+    for group in selected:
+        groups[group](results)
+
+    for name, result in results.items():
+        print(f"{name:<26} {result['seconds'] * 1000:12.4f} ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "patterns_version": core.PATTERNS_VERSION,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {os.path.relpath(args.output, REPO_DIR)}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
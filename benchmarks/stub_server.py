@@ -0,0 +1,100 @@
+"""Local stand-in for autotraveler.ru serving the synthetic fixtures.
+
+Each country page is served at /<slug>/ like on the real site. Latency
+and errors are injected per request so the fetch pipeline can be
+measured without the network:
+
+    python benchmarks/stub_server.py --port 8080 --latency 0.2 --jitter 0.1 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import random
+
+from aiohttp import web
+
+from common import core, load_fixture, url_slug
+
+
+class StubServer:
+    """aiohttp app with configurable latency (latency + uniform jitter) and HTTP 500 rate
+
+    With chunk_delay the body is sent in 16 KiB chunks with that pause
+    between them, like a slow link.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, slow=None, seed=0, chunk_delay=0.0):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow = slow or {}  # slug -> extra latency, seconds
+        self.random = random.Random(seed)
+        self.pages = {url_slug(country): load_fixture(country) for country in core.COUNTRIES}
+        self.requests = 0
+        self.errors = 0
+        self.runner = None
+        self.port = None
+
+    async def handle(self, request):
+        slug = request.match_info["slug"]
+        self.requests += 1
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter) + self.slow.get(slug, 0.0))
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500, text="injected error")
+        if slug not in self.pages:
+            return web.Response(status=404)
+        if not self.chunk_delay:
+            return web.Response(text=self.pages[slug], content_type="text/html")
+
+        body = self.pages[slug].encode("utf-8")
+        response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+        response.content_length = len(body)
+        await response.prepare(request)
+        try:
+            for offset in range(0, len(body), 16 * 1024):
+                await response.write(body[offset:offset + 16 * 1024])
+                await asyncio.sleep(self.chunk_delay)
+        except ConnectionResetError:
+            pass  # The client stopped reading early
+        return response
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_get("/{slug}/", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.port = self.runner.addresses[0][1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def urls(self, base):
+        """URLS mapping pointed at this server"""
+        return {country: f"{base}/{url_slug(country)}/#fuel" for country in core.COUNTRIES}
+
+
+async def serve(args):
+    server = StubServer(args.latency, args.jitter, args.error_rate, chunk_delay=args.chunk_delay)
+    base = await server.start(port=args.port)
+    print(f"Serving fixtures at {base}")
+    for country, url in server.urls(base).items():
+        print(f"  {country}: {url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="base delay per request, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform random delay, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="pause between 16 KiB body chunks, seconds")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
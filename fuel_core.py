@@ -0,0 +1,1253 @@
+"""Headless fuel price scraper: country pages, extraction patterns, fetching, caching, FX rates and metrics
+
+FT.py (the Discord bot) is built on this module; it does not import
+discord.py and loads aiohttp only when something is fetched, so it is
+cheap to import from cron jobs, workers and other services.
+
+Usage: python fuel_core.py [COUNTRY ...] [--format json|csv] [--fresh] [-v]
+"""
+import asyncio
+import re
+import logging
+import logging.handlers
+import queue
+import atexit
+import os
+import random
+import json
+import time
+import hashlib
+import codecs
+import threading
+import signal
+import concurrent.futures
+import itertools
+
+# Setup logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json" (one object per line)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # Share of per-country/per-fuel INFO records kept
+LOG_TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_JSON_FIELDS = ("country", "fuel", "status", "pattern")  # Passed with extra=, included in JSON output
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with LOG_JSON_FIELDS passed in `extra`"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in LOG_JSON_FIELDS:
+            if field in record.__dict__:
+                entry[field] = record.__dict__[field]
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a share of the records below WARNING, all warnings and errors"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for an in-process queue: the record is enqueued as is
+
+    The stock handler formats the message before enqueueing so records can
+    be pickled; here the listener thread does the formatting instead. Log
+    arguments must not be mutated after the call, which holds for the
+    strings, numbers and PriceRecords logged here.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def log_handler():
+    """The handler that actually writes records, with the configured formatter"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(LOG_TEXT_FORMAT))
+    return handler
+
+
+def setup_logging():
+    """Route all records through a queue; a background thread formats and writes them
+
+    The event loop only enqueues records, so a slow terminal or log pipe
+    never stalls the gateway or voice.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, log_handler(), respect_handler_level=True)
+    root = logging.getLogger()
+    root.handlers[:] = [LocalQueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+logger = logging.getLogger(__name__)
+# Per-country and per-fuel progress of a scrape, sampled with LOG_SAMPLE_RATE
+scrape_logger = logging.getLogger(f"{__name__}.scrape")
+scrape_logger.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+# === Configuration ===
+# HTTP fetch settings
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "4"))  # Max pages fetched at once
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "10"))  # Per-request timeout, seconds
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "2"))  # Extra attempts after the first one
+FETCH_BACKOFF_BASE = 0.5  # First retry delay, seconds (doubled on each attempt)
+FETCH_BACKOFF_MAX = 5.0  # Upper bound for a single retry delay, seconds
+HTTP_KEEPALIVE = 75  # Keep idle connections open between refreshes, seconds
+STREAM_CHUNK_SIZE = 16 * 1024  # Read size when streaming a page, bytes
+STREAM_MAX_SECTION = 512 * 1024  # Give up streaming if the #fuel section grows beyond this, characters
+HTTP_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+
+# Price extraction off the event loop
+EXTRACT_EXECUTOR = os.getenv("EXTRACT_EXECUTOR", "process")  # "process", "thread" or "inline"
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))  # Pool size
+EXTRACT_CPU_BUDGET = float(os.getenv("EXTRACT_CPU_BUDGET", "2.0"))  # CPU seconds allowed per page
+
+# Local state
+DATA_DIR = os.getenv("FT_DATA_DIR", "data")  # Directory for caches and snapshots
+HTTP_CACHE_DIR = os.path.join(DATA_DIR, "http_cache")  # Response snapshots with ETag / Last-Modified
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))  # Reuse cached prices without any request, seconds
+PATTERN_STATS_FILE = os.path.join(DATA_DIR, "pattern_stats.json")  # Winning pattern per country and fuel
+PATTERN_RECHECK = int(os.getenv("PATTERN_RECHECK", "10"))  # Every Nth page tries all patterns in order again
+
+# Metrics endpoint (Prometheus text format), METRICS_PORT=0 disables it
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Exchange rates
+FX_URL = os.getenv("FX_URL", "https://open.er-api.com/v6/latest/EUR")  # JSON with {"base_code", "rates"}
+FX_REFRESH = float(os.getenv("FX_REFRESH", str(6 * 3600)))  # Rates older than this are fetched again, seconds
+FX_RETRY = 300  # Wait this long after a failed rates fetch before trying again, seconds
+FX_RATES_FILE = os.path.join(DATA_DIR, "fx_rates.json")  # Last fetched rates, used while offline
+FX_FALLBACK_RATES = {"EUR": 1.0, "RUB": 0.011, "CZK": 0.041, "UAH": 0.024}  # EUR per unit, if nothing was ever fetched
+
+COUNTRIES = [
+    "Россия", "Германия", "Чехия", "Украина"
+]
+
+URLS = {
+    "Россия": "https://autotraveler.ru/russia/#fuel",
+    "Германия": "https://autotraveler.ru/germany/#fuel",
+    "Чехия": "https://autotraveler.ru/czech/#fuel",
+    "Украина": "https://autotraveler.ru/ukraine/#fuel"
+}
+
+# Country flags mapping
+COUNTRY_FLAGS = {
+    "Россия": "🇷🇺", "Германия": "🇩🇪", "Чехия": "🇨🇿", "Украина": "🇺🇦"
+}
+
+# Regex patterns that work with actual website HTML structure
+PATTERNS = {
+    "Россия": {
+        "petrol": [
+            r"АИ-95</span>.*?RUB.*?<span[^>]*>([\d\.,]+)</span>\s*\(€[^\d]*([\d\.,]+)\)",  # HTML with RUB and EUR
+            r"АИ-95</span>.*?€[^\d]*([\d\.,]+)",  # EUR from HTML
+            r"АИ-95.*?€\s*([\d\.,]+)",  # Fallback EUR
+        ],
+        "diesel": [
+            r"ДТ</span>.*?RUB.*?<span[^>]*>([\d\.,]+)</span>\s*\(€[^\d]*([\d\.,]+)\)",  # HTML with RUB and EUR
+            r"ДТ</span>.*?€[^\d]*([\d\.,]+)",  # EUR from HTML
+            r"ДТ[^П].*?€\s*([\d\.,]+)",  # Fallback EUR (avoid ДТП)
+        ],
+    },
+    "Германия": {
+        "petrol": [
+            r"Super\s*\(95\).*?€.*?<span[^>]*>([\d\.,]+)</span>",  # HTML span structure
+            r"E10.*?€.*?<span[^>]*>([\d\.,]+)</span>",  # Alternative E10 pattern
+            r"Super\s*\(95\).*?€.*?([\d\.,]+)",  # Fallback
+        ],
+        "diesel": [
+            r"Diesel.*?€.*?<span[^>]*>([\d\.,]+)</span>",  # HTML span structure
+            r"Diesel.*?€.*?([\d\.,]+)",  # Fallback
+        ],
+    },
+    "Чехия": {
+        "petrol": [
+            r"Natural\s*95</span>.*?CZK.*?<span[^>]*>([\d\.,]+)</span>\s*\(€\s*([\d\.,]+)\)",  # HTML with CZK and EUR
+            r"Natural\s*95</span>.*?€\s*([\d\.,]+)",  # EUR from HTML
+            r"Natural\s*95.*?€\s*([\d\.,]+)",  # Fallback EUR
+        ],
+        "diesel": [
+            r"Nafta</span>.*?CZK.*?<span[^>]*>([\d\.,]+)</span>\s*\(€\s*([\d\.,]+)\)",  # HTML with CZK and EUR
+            r"Nafta</span>.*?€\s*([\d\.,]+)",  # EUR from HTML
+            r"Nafta.*?€\s*([\d\.,]+)",  # Fallback EUR
+        ],
+    },
+    "Украина": {
+        "petrol": [
+            r"АИ-95</span>.*?UAH.*?<span[^>]*>([\d\.,]+)</span>\s*\(€\s*([\d\.,]+)\)",  # HTML with UAH and EUR
+            r"АИ-95.*?UAH.*?([\d\.,]+).*?\(€\s*([\d\.,]+)\)",  # Alternative pattern
+            r"АИ-95.*?€\s*([\d\.,]+)",  # Fallback EUR only
+        ],
+        "diesel": [
+            r"ДТ</span>.*?UAH.*?<span[^>]*>([\d\.,]+)</span>\s*\(€\s*([\d\.,]+)\)",  # HTML with UAH and EUR
+            r"ДТ.*?UAH.*?([\d\.,]+).*?\(€\s*([\d\.,]+)\)",  # Alternative pattern
+            r"ДТ[^П].*?€\s*([\d\.,]+)",  # Fallback EUR only
+        ],
+    }
+}
+
+# Country-specific currency information
+COUNTRY_CURRENCIES = {
+    "Россия": "RUB", "Германия": "EUR", "Чехия": "CZK", "Украина": "UAH"
+}
+
+
+# Enhanced patterns for better data extraction
+def get_country_patterns(country):
+    """Get regex patterns for a specific country"""
+    if country in PATTERNS:
+        return PATTERNS[country]
+
+    # Improved patterns that focus on realistic price ranges and avoid date/time matches
+    return {
+        "petrol": [
+            # More specific patterns that avoid large numbers and dates
+            r"(?:Super|Petrol|Benzin|95|E5|SP95).*?€\s*([0-3]\.\d{1,3})",  # EUR prices 0-3.999
+            r"(?:Super|Petrol|Benzin|95|E5|SP95).*?(\d{1,3}\.\d{1,3})\s*€",  # EUR prices reversed
+            r"95.*?€\s*([0-3]\.\d{1,3})",  # 95 octane EUR
+            r"бензин.*?([0-9]{1,3}\.[0-9]{1,3})",  # Local currency (more conservative)
+        ],
+        "diesel": [
+            r"(?:Diesel|Dizel|Дизель).*?€\s*([0-3]\.\d{1,3})",  # EUR prices 0-3.999
+            r"(?:Diesel|Dizel|Дизель).*?(\d{1,3}\.\d{1,3})\s*€",  # EUR prices reversed
+            r"дизель.*?([0-9]{1,3}\.[0-9]{1,3})",  # Local currency
+        ],
+    }
+
+
+# === Metrics ===
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter with labels"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()  # Voice playback reports from the audio thread
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield f"{self.name}{format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(state)) for key, state in self.values.items())
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                labels = format_labels(self.labelnames, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {state[-1]}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, key)} {state[-2]}"
+            yield f"{self.name}_count{format_labels(self.labelnames, key)} {state[-1]}"
+
+
+class MetricsRegistry:
+    """In-process metrics, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+FETCH_DURATION = metrics.histogram(
+    "ft_fetch_duration_seconds", "Time to download a country page, retries included", ["country"])
+FETCH_RESPONSES = metrics.counter(
+    "ft_fetch_responses_total", "Fetch attempts by outcome (HTTP status, cached, timeout, error)", ["country", "status"])
+FETCH_BYTES = metrics.counter("ft_fetch_bytes_total", "Downloaded page bytes", ["country"])
+EXTRACTION_DURATION = metrics.histogram(
+    "ft_extraction_duration_seconds", "Time spent extracting prices from a page", ["country"])
+EXTRACTION_BUDGET_EXCEEDED = metrics.counter(
+    "ft_extraction_budget_exceeded_total", "Pages abandoned after using up EXTRACT_CPU_BUDGET", ["country"])
+PATTERN_MATCHES = metrics.counter(
+    "ft_pattern_matches_total", "Index (1-based) of the pattern that matched, or none", ["country", "fuel", "pattern"])
+PATTERN_DRIFT = metrics.counter(
+    "ft_pattern_drift_total", "Winning pattern changed, only the loosest fallback matched, or matching stopped",
+    ["country", "fuel", "reason"])
+_metrics_runner = None
+
+
+async def handle_metrics(request):
+    from aiohttp import web
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server():
+    """Serve /metrics on METRICS_HOST:METRICS_PORT (once per process)"""
+    global _metrics_runner
+    if _metrics_runner is not None or not METRICS_PORT:
+        return
+    from aiohttp import web
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        logger.error(f"Failed to start metrics endpoint: {e}")
+        await runner.cleanup()
+        return
+    _metrics_runner = runner
+    logger.info(f"Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+
+# === Extraction engine ===
+FUEL_TYPES = ("petrol", "diesel")
+REGEX_FLAGS = re.IGNORECASE | re.DOTALL
+# Pages link prices as "#fuel": the section starts at that anchor and ends at the next <h2>.
+# Plain str.find is used for both, a regex scan over the whole page would cost as much as the match itself.
+FUEL_SECTION_ANCHORS = ('id="fuel"', "id='fuel'", 'name="fuel"', "name='fuel'")
+FUEL_SECTION_END = "<h2"
+
+
+def compile_patterns(patterns):
+    """Compile a {fuel: [pattern, ...]} table into {fuel: [(pattern, regex), ...]}"""
+    return {
+        fuel: [(pattern, re.compile(pattern, REGEX_FLAGS)) for pattern in fuel_patterns]
+        for fuel, fuel_patterns in patterns.items()
+    }
+
+
+# Compiled once at import time
+COMPILED_PATTERNS = {country: compile_patterns(patterns) for country, patterns in PATTERNS.items()}
+DEFAULT_COMPILED_PATTERNS = compile_patterns(get_country_patterns(None))
+# Cached extraction results are only reused while the patterns that produced them are unchanged
+PATTERNS_VERSION = hashlib.sha1(repr((PATTERNS, get_country_patterns(None))).encode("utf-8")).hexdigest()[:12]
+
+
+def get_compiled_patterns(country):
+    """Get compiled regex patterns for a specific country"""
+    return COMPILED_PATTERNS.get(country, DEFAULT_COMPILED_PATTERNS)
+
+
+def find_section_anchor(text):
+    """Position and length of the first #fuel anchor in text, or (-1, 0)"""
+    found = [(pos, len(anchor)) for anchor in FUEL_SECTION_ANCHORS if (pos := text.find(anchor)) != -1]
+    return min(found) if found else (-1, 0)
+
+
+def fuel_section(text):
+    """Cut the #fuel section out of a page, or return the whole page if there is none"""
+    pos, length = find_section_anchor(text)
+    if pos == -1:
+        return text
+
+    start = max(text.rfind("<", 0, pos), 0)
+    end = text.find(FUEL_SECTION_END, pos + length)
+    return text[start:end if end != -1 else len(text)]
+
+
+def match_fuel(regexes, text, first=None):
+    """Try patterns in order, returns (index, pattern, match) or None
+
+    With `first`, patterns before it are only tried when none from `first`
+    on matches, so the order among the remaining patterns never changes.
+    """
+    if not first or not 0 < first < len(regexes):
+        first = 0
+    for i in itertools.chain(range(first, len(regexes)), range(first)):
+        pattern, regex = regexes[i]
+        match = regex.search(text)
+        if match:
+            return i, pattern, match
+    return None
+
+
+def extract_prices(country, text, preferred=None):
+    """Find petrol and diesel matches in a page, returns {fuel: (index, pattern, match) or None}
+
+    Matching runs on the #fuel section only. A fuel that is not found there
+    (e.g. after a layout change) is retried on the whole page. `preferred`
+    maps a fuel to the first pattern index worth trying (see PatternStats).
+    """
+    compiled = get_compiled_patterns(country)
+    preferred = preferred or {}
+    section = fuel_section(text)
+    found = {fuel: match_fuel(compiled[fuel], section, preferred.get(fuel)) for fuel in FUEL_TYPES}
+
+    if section is not text:
+        for fuel in FUEL_TYPES:
+            if found[fuel] is None:
+                found[fuel] = match_fuel(compiled[fuel], text, preferred.get(fuel))
+
+    return found
+
+
+class PatternStats:
+    """Which pattern wins for each country and fuel, kept in a JSON file
+
+    Patterns before the last winner failed on the previous page and are
+    skipped, except on every PATTERN_RECHECK-th page of a country, when all
+    of them are tried in order again. A change of winner is reported as
+    layout drift, and so is every page that only the loosest fallback
+    pattern still matches or nothing matches at all: logged, counted and
+    passed to drift_listeners (the bot dispatches it as a "pattern_drift"
+    event).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stats = {}  # country -> fuel -> {"winner": index or None, "skipped": pages, "wins": [count per pattern]}
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stats = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load pattern stats {self.path}: {e}")
+            return
+        if stats.get("patterns_version") != PATTERNS_VERSION:
+            # Indexes refer to a different pattern table
+            logger.info("Patterns changed, starting pattern stats afresh")
+            return
+        self.stats = stats.get("countries", {})
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump({"patterns_version": PATTERNS_VERSION, "countries": self.stats}, f, ensure_ascii=False)
+            os.replace(f"{self.path}.tmp", self.path)
+            self.dirty = False
+        except OSError as e:
+            logger.error(f"Failed to save pattern stats {self.path}: {e}")
+
+    def winner(self, country, fuel):
+        """Index of the pattern that matched last time, or None"""
+        return self.stats.get(country, {}).get(fuel, {}).get("winner")
+
+    def preferred(self, country):
+        """{fuel: first pattern index worth trying} for extract_prices"""
+        return {fuel: entry["winner"] for fuel, entry in self.stats.get(country, {}).items()
+                if entry.get("winner") and entry.get("skipped", 0) < PATTERN_RECHECK}
+
+    def record(self, country, fuel, index):
+        """Record the winning pattern index (None if nothing matched), returns the drift reason or None"""
+        patterns = get_compiled_patterns(country)[fuel]
+        entry = self.stats.setdefault(country, {}).setdefault(fuel, {"winner": None, "wins": []})
+        previous = entry["winner"]
+        if previous and entry.get("skipped", 0) < PATTERN_RECHECK:
+            # This page skipped the patterns before the winner
+            entry["skipped"] = entry.get("skipped", 0) + 1
+        else:
+            entry["skipped"] = 0
+        if index is not None:
+            wins = entry["wins"]
+            wins.extend([0] * (len(patterns) - len(wins)))
+            wins[index] += 1
+        entry["winner"] = index
+        self.dirty = True
+
+        if index is None:
+            return "lost"
+        if index == len(patterns) - 1 and len(patterns) > 1:
+            return "fallback"
+        if previous is not None and index != previous:
+            return "changed"
+        return None
+
+
+NO_DATA = "Нет данных"
+
+
+class PriceRecord:
+    """One fuel price: local amount and currency, EUR amount and the index of the pattern that found it"""
+    __slots__ = ("local_amount", "currency", "eur_amount", "pattern_index")
+
+    def __init__(self, local_amount=None, currency=None, eur_amount=None, pattern_index=None):
+        self.local_amount = local_amount
+        self.currency = currency
+        self.eur_amount = eur_amount
+        self.pattern_index = pattern_index
+
+    def __eq__(self, other):
+        if not isinstance(other, PriceRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"PriceRecord({self.local_amount!r}, {self.currency!r}, {self.eur_amount!r}, {self.pattern_index!r})"
+
+    def __str__(self):
+        if self.local_amount is not None and self.eur_amount is not None:
+            return f"{format_amount(self.local_amount)} {self.currency} (€{format_amount(self.eur_amount)})"
+        if self.local_amount is not None:
+            return f"{format_amount(self.local_amount)} {self.currency}"
+        return f"€{format_amount(self.eur_amount)}"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def format_amount(amount):
+    """Render a price with two decimals, or three when the source had them (€1.799)"""
+    text = f"{amount:.3f}"
+    return text[:-1] if text.endswith("0") else text
+
+
+def render_price(record):
+    """Display text for a price record, None means no data"""
+    return str(record) if record is not None else NO_DATA
+
+
+def parse_amount(text):
+    """Parse a scraped number such as "55,30" into a float"""
+    return float(text.replace(",", "."))
+
+
+def prices_to_dict(prices):
+    """{fuel: PriceRecord or None} -> JSON-friendly dict"""
+    return {fuel: record.to_dict() if record is not None else None for fuel, record in prices.items()}
+
+
+def prices_from_dict(data):
+    """Inverse of prices_to_dict"""
+    return {fuel: PriceRecord.from_dict(record) if record is not None else None for fuel, record in data.items()}
+
+
+# === Exchange rates ===
+class FxRates:
+    """EUR value of one unit of each currency, fetched from FX_URL and kept in a JSON file
+
+    Rates are fetched again once they are older than `ttl`. If that fails,
+    the last stored rates (or FX_FALLBACK_RATES) stay in use.
+    """
+
+    def __init__(self, path, url, ttl, fallback):
+        self.path = path
+        self.url = url
+        self.ttl = ttl
+        self.rates = dict(fallback)
+        self.updated_at = 0.0  # time.time() the rates were published by FX_URL or fetched
+        self.checked_at = 0.0  # Last fetch attempt, successful or not
+        self._lock = None
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+            rates = {currency: float(rate) for currency, rate in stored["rates"].items() if rate}
+            updated_at = float(stored["updated_at"])
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.error(f"Failed to load exchange rates {self.path}: {e}")
+            return
+        if updated_at > self.updated_at:
+            self.rates = dict(FX_FALLBACK_RATES, **rates)
+            self.updated_at = updated_at
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+                json.dump({"updated_at": self.updated_at, "rates": self.rates}, f)
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError as e:
+            logger.error(f"Failed to save exchange rates {self.path}: {e}")
+
+    @property
+    def stale(self):
+        return time.time() - self.updated_at >= self.ttl
+
+    def eur_rate(self, currency):
+        """EUR per unit of currency, or None if unknown"""
+        return self.rates.get(currency)
+
+    def currencies(self):
+        return sorted(self.rates)
+
+    async def refresh(self, session=None):
+        """Fetch the rates if they are stale, keeping the stored ones on failure"""
+        if not self.stale or time.time() - self.checked_at < FX_RETRY:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another process (or a concurrent caller) may have fetched them meanwhile
+            await asyncio.to_thread(self.load)
+            if not self.stale or time.time() - self.checked_at < FX_RETRY:
+                return
+            self.checked_at = time.time()
+            import aiohttp
+            try:
+                session = session or get_http_session()
+                timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+                async with session.get(self.url, timeout=timeout) as resp:
+                    resp.raise_for_status()
+                    payload = await resp.json(content_type=None)
+                units = payload["rates"]
+                base = payload.get("base_code") or payload.get("base") or "EUR"
+                # units[c] is c per one `base`, so one c is worth units["EUR"] / units[c] EUR
+                per_eur = 1.0 if base == "EUR" else float(units["EUR"])
+                rates = {currency: per_eur / float(rate) for currency, rate in units.items() if rate}
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, TypeError, AttributeError) as e:
+                logger.warning(f"Failed to fetch exchange rates, keeping the stored ones: {e}")
+                return
+            self.rates = dict(FX_FALLBACK_RATES, **rates)
+            self.updated_at = float(payload.get("time_last_update_unix") or time.time())
+            if self.stale:  # Publisher timestamp older than the refresh interval
+                self.updated_at = time.time()
+            await asyncio.to_thread(self.save)
+            logger.info(f"Exchange rates updated for {len(self.rates)} currencies")
+
+
+fx_rates = FxRates(FX_RATES_FILE, FX_URL, FX_REFRESH, FX_FALLBACK_RATES)
+fx_rates.load()
+
+
+def format_price(country, fuel_type, match, pattern, pattern_index=None, eur_rates=None):
+    """Build a PriceRecord from a pattern match based on country and available data, None if there is no price
+
+    `eur_rates` ({currency: EUR per unit}) defaults to the current fx_rates table.
+    """
+    try:
+        if not match:
+            return None
+
+        groups = match.groups()
+        currency = COUNTRY_CURRENCIES.get(country, "EUR")
+
+        if country in ("Россия", "Чехия", "Украина"):
+            if len(groups) >= 2 and groups[1]:  # Local currency with EUR
+                return PriceRecord(parse_amount(groups[0]), currency, parse_amount(groups[1]), pattern_index)
+            elif len(groups) >= 1 and groups[0]:  # Single currency
+                price = parse_amount(groups[0])
+                if currency in pattern:
+                    return PriceRecord(price, currency, None, pattern_index)
+                else:
+                    return PriceRecord(None, None, price, pattern_index)
+
+        elif country == "Германия":
+            if len(groups) >= 1 and groups[0]:
+                return PriceRecord(None, None, parse_amount(groups[0]), pattern_index)
+
+        # Enhanced formatting for all other countries with local currency
+        else:
+            if len(groups) >= 1 and groups[0]:
+                price = parse_amount(groups[0])
+
+                # For EUR countries and EUR prices detected
+                if currency == "EUR" or "€" in pattern:
+                    # Validate EUR price ranges
+                    if 0.5 <= price <= 3.0:
+                        return PriceRecord(None, None, price, pattern_index)
+                    return None  # Invalid EUR price range
+                else:
+                    if eur_rates is None:
+                        eur_rates = fx_rates.rates
+
+                    if currency in eur_rates and price < 10000:  # Reasonable local currency check
+                        eur_price = round(price * eur_rates[currency], 3)
+                        if 0.3 <= eur_price <= 5.0:  # Reasonable EUR equivalent range
+                            return PriceRecord(price, currency, eur_price, pattern_index)
+                        return None  # Invalid converted price
+                    return PriceRecord(price, currency, None, pattern_index)
+
+        return None
+    except Exception as e:
+        logger.error("Error formatting price for %s %s: %s", country, fuel_type, e)
+        return None
+
+
+def needs_fx_rates(countries):
+    """True if format_price converts local prices of any of the countries with the fx_rates table
+
+    The countries with their own branch take EUR amounts from the page.
+    """
+    return any(country not in ("Россия", "Германия", "Чехия", "Украина")
+               and COUNTRY_CURRENCIES.get(country, "EUR") != "EUR" for country in countries)
+
+
+# Shared HTTP session (created lazily inside the running event loop)
+_http_session = None
+
+
+def get_http_session():
+    """Return the shared keep-alive HTTP session, creating it if needed"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        import aiohttp
+        connector = aiohttp.TCPConnector(
+            limit=FETCH_CONCURRENCY,
+            limit_per_host=FETCH_CONCURRENCY,
+            keepalive_timeout=HTTP_KEEPALIVE,
+            ttl_dns_cache=300,
+        )
+        _http_session = aiohttp.ClientSession(connector=connector, headers=HTTP_HEADERS)
+    return _http_session
+
+
+async def close_http_session():
+    """Close the shared HTTP session"""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+
+def retry_delay(attempt):
+    """Jittered exponential backoff delay for the given retry attempt"""
+    return random.uniform(0, min(FETCH_BACKOFF_MAX, FETCH_BACKOFF_BASE * 2 ** attempt))
+
+
+def response_encoding(resp):
+    """Charset of a response whose body has not been read yet"""
+    try:
+        return resp.get_encoding()
+    except RuntimeError:  # No charset in Content-Type, autotraveler.ru serves UTF-8
+        return "utf-8"
+
+
+async def read_fuel_section(resp):
+    """Stream a response and return (section, bytes_read) as soon as the #fuel section is complete
+
+    Before the anchor only a short tail of the page is kept. The section
+    is the same slice fuel_section() cuts from the full page. Returns
+    (None, bytes_read) when the page has no anchor or the section is too
+    large.
+    """
+    decoder = codecs.getincrementaldecoder(response_encoding(resp))(errors="replace")
+    tail = 1024  # Enough to hold an anchor split across chunks and the "<" of its tag
+    window = ""
+    anchor_end = None  # Offset in window just past the anchor, once found
+    size = 0
+
+    async for chunk in resp.content.iter_chunked(STREAM_CHUNK_SIZE):
+        size += len(chunk)
+        window += decoder.decode(chunk)
+
+        if anchor_end is None:
+            pos, length = find_section_anchor(window)
+            if pos == -1:
+                window = window[-tail:]
+                continue
+            start = max(window.rfind("<", 0, pos), 0)
+            window = window[start:]
+            anchor_end = pos - start + length
+
+        end = window.find(FUEL_SECTION_END, anchor_end)
+        if end != -1:
+            return window[:end], size
+        if len(window) > STREAM_MAX_SECTION:
+            return None, size
+
+    window += decoder.decode(b"", final=True)
+    if anchor_end is None:
+        return None, size
+    return window, size  # Section runs to the end of the page
+
+
+async def fetch_page(session, country, url, headers=None, section_only=False):
+    """Download a page with per-request timeout and retries
+
+    Returns (status, text, validators) for 200 and 304 responses, None on failure.
+    With section_only the body is streamed and text is only the #fuel
+    section (None if there is none); the connection is closed as soon as
+    the section has been read.
+    """
+    import aiohttp
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    started = time.perf_counter()
+
+    try:
+        for attempt in range(FETCH_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(retry_delay(attempt - 1))
+            try:
+                async with session.get(url, headers=headers, timeout=timeout) as resp:
+                    FETCH_RESPONSES.inc(country=country, status=resp.status)
+                    if resp.status == 304:
+                        return 304, None, {}
+                    if resp.status == 200:
+                        validators = {
+                            "etag": resp.headers.get("ETag"),
+                            "last_modified": resp.headers.get("Last-Modified"),
+                        }
+                        if section_only:
+                            text, size = await read_fuel_section(resp)
+                            resp.close()  # Drop the rest of the page instead of draining it
+                        else:
+                            size = len(await resp.read())
+                            text = await resp.text()
+                        FETCH_BYTES.inc(size, country=country)
+                        return 200, text, validators
+                    logger.error("Failed to fetch %s: HTTP %s (attempt %d)", country, resp.status, attempt + 1)
+                    # Client errors other than rate limiting will not go away on retry
+                    if resp.status < 500 and resp.status != 429:
+                        return None
+            except asyncio.TimeoutError:
+                FETCH_RESPONSES.inc(country=country, status="timeout")
+                logger.error("Timeout while fetching data for %s (attempt %d)", country, attempt + 1)
+            except aiohttp.ClientError as e:
+                FETCH_RESPONSES.inc(country=country, status="error")
+                logger.error("Error fetching data for %s: %s (attempt %d)", country, e, attempt + 1)
+
+        return None
+    finally:
+        FETCH_DURATION.observe(time.perf_counter() - started, country=country)
+
+
+# Countries whose pages did not yield both prices from the streamed #fuel section
+_full_page_countries = set()
+
+
+# === HTTP response cache ===
+# url -> {"etag", "last_modified", "fetched_at", "patterns_version", "prices"}
+_response_cache = {}
+
+
+def cache_slug(url):
+    """File name stem for a cached URL"""
+    return re.sub(r"\W+", "_", url.split("#")[0].split("://", 1)[-1]).strip("_")
+
+
+def load_cache_entry(url):
+    """Get the cache entry for a URL from memory or disk"""
+    entry = _response_cache.get(url)
+    if entry is None:
+        try:
+            with open(os.path.join(HTTP_CACHE_DIR, f"{cache_slug(url)}.json"), encoding="utf-8") as f:
+                entry = json.load(f)
+            entry["prices"] = prices_from_dict(entry["prices"])
+            _response_cache[url] = entry
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    return entry
+
+
+def load_cached_body(url):
+    """Get the body snapshot stored with a cache entry"""
+    try:
+        with open(os.path.join(HTTP_CACHE_DIR, f"{cache_slug(url)}.html"), encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def save_cache_entry(url, entry, body=None):
+    """Write a cache entry (and optionally its body snapshot) to disk"""
+    try:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        stem = os.path.join(HTTP_CACHE_DIR, cache_slug(url))
+        if body is not None:
+            with open(f"{stem}.html", "w", encoding="utf-8") as f:
+                f.write(body)
+        with open(f"{stem}.json.tmp", "w", encoding="utf-8") as f:
+            json.dump(dict(entry, prices=prices_to_dict(entry["prices"])), f, ensure_ascii=False)
+        os.replace(f"{stem}.json.tmp", f"{stem}.json")
+    except OSError as e:
+        logger.error("Failed to save HTTP cache for %s: %s", url, e)
+
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers for a cache entry"""
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class ExtractionBudgetExceeded(Exception):
+    """A page used up its EXTRACT_CPU_BUDGET during extraction"""
+
+
+def _budget_exceeded(signum, frame):
+    raise ExtractionBudgetExceeded()
+
+
+def _init_extract_worker():
+    """Process pool initializer: the CPU budget is enforced with SIGVTALRM"""
+    signal.signal(signal.SIGVTALRM, _budget_exceeded)
+    # A forked worker has the parent's queue but not its listener thread, write directly
+    logging.getLogger().handlers[:] = [log_handler()]
+
+
+def extract_page_prices(country, text, budget=None, preferred=None, eur_rates=None):
+    """Extract and format both fuel prices, safe to run in a worker
+
+    Returns ({fuel: (index, groups, PriceRecord or None) or None}, seconds).
+    In a process worker the regex scan is interrupted once it has used
+    `budget` seconds of CPU time.
+    """
+    timed = budget and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread() \
+        and signal.getsignal(signal.SIGVTALRM) is _budget_exceeded
+    started = time.perf_counter()
+    if timed:
+        signal.setitimer(signal.ITIMER_VIRTUAL, budget)
+    try:
+        extracted = {}
+        for fuel, found in extract_prices(country, text, preferred).items():
+            if found is None:
+                extracted[fuel] = None
+                continue
+            i, pattern, match = found
+            extracted[fuel] = (i, match.groups(), format_price(country, fuel, match, pattern, i, eur_rates))
+    finally:
+        if timed:
+            signal.setitimer(signal.ITIMER_VIRTUAL, 0)
+    return extracted, time.perf_counter() - started
+
+
+_extract_pool = None
+pattern_stats = PatternStats(PATTERN_STATS_FILE)
+pattern_stats.load()
+
+
+def get_extract_pool():
+    """Executor for extract_page_prices, None for inline extraction"""
+    global _extract_pool
+    if _extract_pool is None and EXTRACT_EXECUTOR != "inline":
+        if EXTRACT_EXECUTOR == "process":
+            _extract_pool = concurrent.futures.ProcessPoolExecutor(EXTRACT_WORKERS, initializer=_init_extract_worker)
+        else:
+            _extract_pool = concurrent.futures.ThreadPoolExecutor(EXTRACT_WORKERS, thread_name_prefix="extract")
+    return _extract_pool
+
+
+def reset_extract_pool():
+    """Throw away a pool whose worker is stuck or dead"""
+    global _extract_pool
+    pool, _extract_pool = _extract_pool, None
+    if pool is None:
+        return
+    # A process stuck in a regex does not react to shutdown, terminate it
+    processes = getattr(pool, "_processes", None) or {}
+    for process in list(processes.values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_extract_pool():
+    """Stop the extraction workers once they are idle"""
+    global _extract_pool
+    pool, _extract_pool = _extract_pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def record_extraction(country, extracted, elapsed, partial_ok):
+    """Log and count extraction results, returns {fuel: PriceRecord or None}"""
+    EXTRACTION_DURATION.observe(elapsed, country=country)
+    if not partial_ok and any(found is None for found in extracted.values()):
+        return None
+
+    result = {"petrol": None, "diesel": None}
+    for fuel, found in extracted.items():
+        PATTERN_MATCHES.inc(country=country, fuel=fuel, pattern=found[0] + 1 if found else "none")
+        record_pattern(country, fuel, found[0] if found else None)
+        if found is None:
+            scrape_logger.debug("%s %s: no pattern matched", country, fuel, extra={"country": country, "fuel": fuel})
+            continue
+        i, groups, record = found
+        result[fuel] = record
+        scrape_logger.info("%s %s found with pattern %d: %s", country, fuel, i + 1, record,
+                           extra={"country": country, "fuel": fuel, "pattern": i + 1})
+        scrape_logger.debug("%s %s groups: %s", country, fuel, groups)
+
+    if result["petrol"] is None:
+        logger.warning("No petrol price found for %s", country)
+    if result["diesel"] is None:
+        logger.warning("No diesel price found for %s", country)
+
+    return result
+
+
+# Called as listener(country, fuel, reason, previous index, new index) on layout drift
+drift_listeners = []
+
+
+def record_pattern(country, fuel, index):
+    """Update pattern stats and report layout drift"""
+    previous = pattern_stats.winner(country, fuel)
+    reason = pattern_stats.record(country, fuel, index)
+    if reason is None:
+        return
+    PATTERN_DRIFT.inc(country=country, fuel=fuel, reason=reason)
+    logger.warning(f"Layout drift for {country} {fuel} ({reason}): pattern "
+                   f"{'none' if previous is None else previous + 1} -> {'none' if index is None else index + 1}")
+    for listener in drift_listeners:
+        listener(country, fuel, reason, previous, index)
+
+
+def parse_country_prices(country, text, partial_ok=True):
+    """Extract both fuel prices from a page on the calling thread, returns {fuel: PriceRecord or None}
+
+    With partial_ok=False, returns None instead when a fuel is missing.
+    """
+    extracted, elapsed = extract_page_prices(country, text, preferred=pattern_stats.preferred(country))
+    return record_extraction(country, extracted, elapsed, partial_ok)
+
+
+async def parse_country_prices_async(country, text, partial_ok=True):
+    """parse_country_prices in the extraction pool, so the event loop keeps serving the gateway and voice
+
+    Raises ExtractionBudgetExceeded when the page takes longer than
+    EXTRACT_CPU_BUDGET (enforced in the worker for process pools; thread
+    pools only stop waiting, the scan itself keeps the GIL until it ends).
+    """
+    pool = get_extract_pool()
+    if pool is None:
+        return parse_country_prices(country, text, partial_ok)
+
+    # Workers have their own copy of fx_rates, pass the current table along
+    job = pool.submit(extract_page_prices, country, text, EXTRACT_CPU_BUDGET,
+                      pattern_stats.preferred(country), fx_rates.rates)
+    try:
+        # Wall-clock guard on top of the CPU budget: queueing plus a worker that ignores the signal
+        extracted, elapsed = await asyncio.wait_for(asyncio.wrap_future(job), EXTRACT_CPU_BUDGET * 2 + 1)
+    except (asyncio.TimeoutError, ExtractionBudgetExceeded):
+        EXTRACTION_BUDGET_EXCEEDED.inc(country=country)
+        # wait_for cancels a job that is still queued; one that is still running holds a stuck worker
+        if EXTRACT_EXECUTOR == "process" and job.running():
+            reset_extract_pool()
+        raise ExtractionBudgetExceeded(f"extraction for {country} exceeded {EXTRACT_CPU_BUDGET}s")
+    except concurrent.futures.process.BrokenProcessPool:
+        reset_extract_pool()
+        raise
+    return record_extraction(country, extracted, elapsed, partial_ok)
+
+
+async def fetch_country_price(session, country):
+    """Fetch fuel prices for a specific country, returns (prices, parsed)
+
+    `parsed` is False when the prices were reused from the response cache
+    (within CACHE_TTL or on 304 Not Modified) or nothing could be fetched.
+    """
+    url = URLS[country]
+    result = {"petrol": None, "diesel": None}
+    parsed = False
+
+    try:
+        entry = load_cache_entry(url)
+        if entry and entry.get("patterns_version") == PATTERNS_VERSION \
+                and time.time() - entry["fetched_at"] < CACHE_TTL:
+            FETCH_RESPONSES.inc(country=country, status="cached")
+            scrape_logger.info("Using cached prices for %s", country, extra={"country": country, "status": "cached"})
+            return dict(entry["prices"]), False
+
+        streamed = country not in _full_page_countries
+        response = await fetch_page(session, country, url, headers=conditional_headers(entry), section_only=streamed)
+        if response is None:
+            return result, False
+        status, text, validators = response
+
+        if status == 304:
+            entry["fetched_at"] = time.time()
+            if entry.get("patterns_version") == PATTERNS_VERSION:
+                scrape_logger.info("%s not modified, reusing cached prices", country,
+                                   extra={"country": country, "status": 304})
+                await asyncio.to_thread(save_cache_entry, url, entry)
+                return dict(entry["prices"]), False
+
+            # Patterns changed since the snapshot was parsed: re-extract it, or download it again if it is gone
+            text = await asyncio.to_thread(load_cached_body, url)
+            validators = {"etag": entry.get("etag"), "last_modified": entry.get("last_modified")}
+            streamed = False
+            if text is None:
+                response = await fetch_page(session, country, url)
+                if response is None or response[1] is None:
+                    return result, False
+                status, text, validators = response
+
+        scrape_logger.info("Successfully fetched data for %s", country, extra={"country": country, "status": status})
+        prices = await parse_country_prices_async(country, text, partial_ok=False) if streamed and text else None
+        if prices is None and streamed:
+            # The streamed section was missing or incomplete: parse the whole page, now and on later refreshes
+            logger.warning("%s: #fuel section not usable, switching to full-page parsing", country)
+            _full_page_countries.add(country)
+            response = await fetch_page(session, country, url)
+            if response is None or response[1] is None:
+                return result, False
+            status, text, validators = response
+        result = prices if prices is not None else await parse_country_prices_async(country, text)
+        parsed = True
+
+        entry = dict(validators, fetched_at=time.time(), patterns_version=PATTERNS_VERSION, prices=result)
+        _response_cache[url] = entry
+        await asyncio.to_thread(save_cache_entry, url, entry, text)
+
+    except Exception as e:
+        logger.error("Error fetching data for %s: %s", country, e)
+
+    return dict(result), parsed
+
+
+async def fetch_fuel_prices(session=None, countries=None):
+    """Fetch fuel prices for the given countries (default: all) concurrently, returns (data, parsed)
+
+    `data` is {country: {fuel: PriceRecord or None}}, `parsed` the set of
+    countries whose prices were extracted from a page fetched just now.
+    """
+    if session is None:
+        session = get_http_session()
+    countries = countries or COUNTRIES
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def fetch_one(country):
+        async with semaphore:
+            scrape_logger.info("Fetching prices for %s", country, extra={"country": country})
+            return await fetch_country_price(session, country)
+
+    results = await asyncio.gather(*(fetch_one(country) for country in countries))
+    data = {country: prices for country, (prices, _) in zip(countries, results)}
+    return data, {country for country, (_, parsed) in zip(countries, results) if parsed}
+
+
+# === Command line ===
+CSV_FIELDS = ("country", "fuel", "local_amount", "currency", "eur_amount", "pattern_index")
+
+
+def write_json(data, out):
+    json.dump({country: prices_to_dict(prices) for country, prices in data.items()}, out, ensure_ascii=False, indent=2)
+    out.write("\n")
+
+
+def write_csv(data, out):
+    import csv
+    writer = csv.writer(out)
+    writer.writerow(CSV_FIELDS)
+    for country, prices in data.items():
+        for fuel, record in prices.items():
+            values = record.to_dict() if record is not None else {}
+            writer.writerow([country, fuel] + [values.get(field) for field in CSV_FIELDS[2:]])
+
+
+async def fetch_countries(countries):
+    """Fetch the given countries and release the session and pool, returns {country: {fuel: PriceRecord or None}}"""
+    try:
+        if needs_fx_rates(countries):
+            await fx_rates.refresh()
+        data, _ = await fetch_fuel_prices(countries=countries)
+    finally:
+        await close_http_session()
+        shutdown_extract_pool()
+    return data
+
+
+def main(argv=None):
+    """Fetch fuel prices and write them to stdout, returns the exit code"""
+    import argparse
+    import sys
+
+    global CACHE_TTL
+    parser = argparse.ArgumentParser(description="Fetch fuel prices without the Discord bot.")
+    parser.add_argument("countries", nargs="*", metavar="COUNTRY", help=f"any of {', '.join(COUNTRIES)} (default: all)")
+    parser.add_argument("--format", choices=("json", "csv"), default="json", help="output format (default: json)")
+    parser.add_argument("--fresh", action="store_true", help="revalidate every page instead of using CACHE_TTL")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    args = parser.parse_args(argv)
+
+    unknown = [country for country in args.countries if country not in URLS]
+    if unknown:
+        parser.error(f"unknown country: {', '.join(unknown)}")
+    if args.fresh:
+        CACHE_TTL = 0
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format=LOG_TEXT_FORMAT,
+                        stream=sys.stderr)
+    data = asyncio.run(fetch_countries(args.countries or COUNTRIES))
+    (write_csv if args.format == "csv" else write_json)(data, sys.stdout)
+    # Exit status 1 when nothing at all could be fetched
+    return 0 if any(record is not None for prices in data.values() for record in prices.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,19 @@
+"""Test setup: the repo on sys.path and a throwaway FT_DATA_DIR.
+
+FT and fuel_core create their stores at import time under FT_DATA_DIR,
+so it has to point at a temporary directory before the first import.
+Nothing here touches the network.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix="ft-tests-")
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+
+os.environ["FT_DATA_DIR"] = DATA_DIR
+os.environ["METRICS_PORT"] = "0"
+sys.path.insert(0, REPO_DIR)
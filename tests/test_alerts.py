@@ -0,0 +1,50 @@
+import pytest
+
+import FT
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FT.SubscriptionStore(str(tmp_path / "subscriptions.json"))
+    for user_id, direction, threshold in ((1, "below", 0.90), (2, "below", 0.95), (3, "below", 1.00),
+                                          (4, "below", 1.05), (5, "above", 0.90), (6, "above", 1.00)):
+        store.add(FT.Subscription(user_id, 10, "Германия", "petrol", direction, threshold))
+    return store
+
+
+def users(subscriptions):
+    return sorted(subscription.user_id for subscription in subscriptions)
+
+
+def test_crossed_falling(store):
+    # new < threshold <= old
+    assert users(store.crossed("Германия", "petrol", 1.00, 0.90)) == [2, 3]
+
+
+def test_crossed_rising(store):
+    # old <= threshold < new
+    assert users(store.crossed("Германия", "petrol", 0.90, 1.00)) == [5]
+    assert users(store.crossed("Германия", "petrol", 0.89, 1.01)) == [5, 6]
+
+
+def test_crossed_no_move(store):
+    assert store.crossed("Германия", "petrol", 1.00, 1.00) == []
+    assert store.crossed("Германия", "petrol", None, 0.90) == []
+    assert store.crossed("Германия", "petrol", 1.00, None) == []
+    assert store.crossed("Германия", "diesel", 1.00, 0.50) == []
+
+
+def test_add_replaces_and_limits(store):
+    store.add(FT.Subscription(2, 10, "Германия", "petrol", "below", 0.80))
+    assert users(store.crossed("Германия", "petrol", 1.00, 0.90)) == [3]
+    assert not store.add(FT.Subscription(1, 10, "Чехия", "diesel", "above", 1.5), limit=1)
+    assert store.add(FT.Subscription(1, 10, "Германия", "petrol", "below", 0.85), limit=1)
+
+
+def test_changes_are_shared_through_the_file(store):
+    other = FT.SubscriptionStore(store.path)
+    other.load()
+    other.add(FT.Subscription(7, 10, "Германия", "petrol", "below", 0.97))
+    assert store.remove(1) == 1
+    store.load()
+    assert users(store.crossed("Германия", "petrol", 1.00, 0.90)) == [2, 3, 7]
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+import FT
+from fuel_core import PriceRecord
+
+
+def prices(petrol):
+    return {"Германия": {"petrol": PriceRecord(None, None, petrol), "diesel": PriceRecord(None, None, 1.6)}}
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    """Stub text channel: records embed descriptions, fails while channel["down"] is set"""
+    channel = {"posted": [], "down": False}
+
+    async def send_to_channel(channel_id, embed, semaphore, content=None):
+        await asyncio.sleep(0.01)
+        if channel["down"]:
+            return False
+        channel["posted"].append(embed.description)
+        return True
+
+    monkeypatch.setattr(FT, "send_to_channel", send_to_channel)
+    monkeypatch.setattr(FT, "local_guild_configs", lambda: [FT.GuildConfig(1, 10)])
+    monkeypatch.setattr(FT, "_broadcast_lock", None)
+    monkeypatch.setattr(FT, "fuel_data", prices(0.9))
+    FT.mark_broadcast(FT.fuel_data)
+    yield channel
+    FT.mark_broadcast(None)
+
+
+def test_price_changes():
+    assert FT.price_changes(prices(0.9), prices(0.9)) == []
+    assert [change[:2] for change in FT.price_changes(prices(0.9), prices(1.0))] == [("Германия", "petrol")]
+
+
+def test_concurrent_broadcasts_post_once(channel):
+    FT.fuel_data = prices(1.0)
+
+    async def both():
+        return await asyncio.gather(FT.broadcast_changes(sound=False), FT.broadcast_changes(sound=False))
+
+    assert asyncio.run(both()) == [1, None]
+    assert len(channel["posted"]) == 1
+    assert "€0.90" in channel["posted"][0] and "€1.00" in channel["posted"][0]
+
+
+def test_failed_broadcast_is_repeated(channel):
+    FT.fuel_data = prices(1.0)
+    channel["down"] = True
+    assert asyncio.run(FT.broadcast_changes(sound=False)) == 0
+    channel["down"] = False
+    assert asyncio.run(FT.broadcast_changes(sound=False)) == 1
+    assert asyncio.run(FT.broadcast_changes(sound=False)) is None
+    assert len(channel["posted"]) == 1
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+import FT
+from fuel_core import PriceRecord
+
+MOSCOW = pytz.timezone("Europe/Moscow")
+
+
+def ts(*args):
+    return MOSCOW.localize(datetime(*args)).timestamp()
+
+
+def snapshot(eur, local=None):
+    return {"Россия": {"petrol": PriceRecord(local, "RUB" if local else None, eur), "diesel": None}}
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = FT.HistoryStore(str(tmp_path / "history.sqlite3"), MOSCOW)
+    store.append(snapshot(0.60, 55.0), ts(2026, 10, 12, 9, 0))
+    store.append(snapshot(0.64, 58.0), ts(2026, 10, 12, 21, 0))
+    store.append(snapshot(0.62, 56.5), ts(2026, 10, 13, 9, 0))
+    store.append(snapshot(0.66), ts(2026, 10, 15, 9, 0))
+    return store
+
+
+def test_history_bucket():
+    assert FT.history_bucket(ts(2026, 10, 15, 23, 59), "day", MOSCOW) == ts(2026, 10, 15)
+    assert FT.history_bucket(ts(2026, 10, 15, 12, 0), "week", MOSCOW) == ts(2026, 10, 12)  # Monday
+    assert FT.history_bucket(ts(2026, 10, 15, 12, 0), "month", MOSCOW) == ts(2026, 10, 1)
+
+
+def test_summary_day(history):
+    summary = history.summary("Россия", "petrol", ts(2026, 10, 12, 15, 0), "day")
+    assert summary["samples"] == 4
+    assert summary["min"] == 0.60
+    assert summary["max"] == 0.66
+    assert summary["avg"] == pytest.approx(0.63)
+    assert (summary["first_ts"], summary["first"]) == (ts(2026, 10, 12, 9, 0), 0.60)
+    assert (summary["last_ts"], summary["last"]) == (ts(2026, 10, 15, 9, 0), 0.66)
+
+
+def test_summary_since_skips_older_buckets(history):
+    summary = history.summary("Россия", "petrol", ts(2026, 10, 13, 0, 0), "day")
+    assert (summary["samples"], summary["first"], summary["last"]) == (2, 0.62, 0.66)
+
+
+def test_summary_coarser_periods_agree(history):
+    for period in ("week", "month"):
+        summary = history.summary("Россия", "petrol", ts(2026, 10, 12), period)
+        assert (summary["samples"], summary["min"], summary["max"]) == (4, 0.60, 0.66)
+
+
+def test_summary_missing(history):
+    assert history.summary("Россия", "diesel", ts(2026, 10, 1), "day") is None
+    assert history.summary("Россия", "petrol", ts(2026, 10, 16), "day") is None
+
+
+def test_append_same_refresh_twice(history):
+    assert history.append(snapshot(0.70), ts(2026, 10, 15, 9, 0)) == 0
+    summary = history.summary("Россия", "petrol", ts(2026, 10, 15), "day")
+    assert (summary["samples"], summary["last"]) == (1, 0.66)
+
+
+def test_history_period_for():
+    assert [FT.history_period_for(days) for days in (7, 31, 90, 366, 5 * 365)] == \
+        ["day", "day", "week", "week", "month"]
@@ -0,0 +1,73 @@
+import os
+import re
+
+import pytest
+
+import fuel_core as core
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+
+@pytest.fixture
+def stats(tmp_path):
+    return core.PatternStats(str(tmp_path / "pattern_stats.json"))
+
+
+def test_record_reasons(stats):
+    fallback = len(core.get_compiled_patterns("Россия")["petrol"]) - 1
+    assert stats.record("Россия", "petrol", 0) is None
+    assert stats.record("Россия", "petrol", 0) is None
+    assert stats.record("Россия", "petrol", 1) == "changed"
+    assert stats.record("Россия", "petrol", 1) is None
+    # Fallback and lost are reported on every page, not only when the winner changes
+    assert stats.record("Россия", "petrol", fallback) == "fallback"
+    assert stats.record("Россия", "petrol", fallback) == "fallback"
+    assert stats.record("Россия", "petrol", None) == "lost"
+    assert stats.record("Россия", "petrol", None) == "lost"
+    assert stats.record("Россия", "petrol", 0) is None  # Recovery from nothing is not drift
+    assert stats.winner("Россия", "petrol") == 0
+
+
+def test_preferred_rechecks_specific_patterns(stats):
+    stats.record("Россия", "petrol", 0)
+    assert stats.preferred("Россия") == {}  # Nothing before pattern 0 to skip
+
+    stats.record("Россия", "petrol", 1)
+    period = core.PATTERN_RECHECK + 1
+    hints = []
+    for _ in range(period * 3):
+        hints.append(stats.preferred("Россия").get("petrol"))
+        stats.record("Россия", "petrol", 1)
+    # Pattern 0 is skipped, except on every PATTERN_RECHECK + 1-th page
+    assert hints == [None if i % period == period - 1 else 1 for i in range(period * 3)]
+
+
+def test_recheck_recovers_the_specific_pattern(stats):
+    with open(os.path.join(FIXTURES_DIR, "russia.html"), encoding="utf-8") as f:
+        text = f.read()
+    stats.record("Россия", "petrol", 1)  # Stale winner, pattern 0 matches this page
+    for _ in range(core.PATTERN_RECHECK + 1):
+        found = core.extract_prices("Россия", text, stats.preferred("Россия"))["petrol"]
+        stats.record("Россия", "petrol", found[0])
+    assert stats.winner("Россия", "petrol") == 0
+    assert stats.preferred("Россия") == {}
+
+
+def test_save_and_load(stats):
+    stats.record("Чехия", "diesel", 1)
+    stats.save()
+    loaded = core.PatternStats(stats.path)
+    loaded.load()
+    assert loaded.winner("Чехия", "diesel") == 1
+
+
+def test_match_fuel_order():
+    regexes = [(name, re.compile(name + r"(\d)")) for name in ("A", "B", "C")]
+    assert core.match_fuel(regexes, "B1 C2")[0] == 1
+    assert core.match_fuel(regexes, "A1 B2 C3")[0] == 0
+    # A hint skips the patterns before it, the rest keep their order
+    assert core.match_fuel(regexes, "A1 B2 C3", 1)[0] == 1
+    # and the skipped ones are still tried when nothing else matches
+    assert core.match_fuel(regexes, "A1", 2)[0] == 0
+    assert core.match_fuel(regexes, "B1", 5)[0] == 1
+    assert core.match_fuel(regexes, "D1", 1) is None
@@ -0,0 +1,73 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+import FT
+
+BERLIN = pytz.timezone("Europe/Berlin")
+
+
+def local(tz, *args):
+    return tz.localize(datetime(*args))
+
+
+def test_parse_cron_field():
+    assert FT.parse_cron_field("*/30", 0, 59) == (0, 30)
+    assert FT.parse_cron_field("1-10/3", 0, 59) == (1, 4, 7, 10)
+    assert FT.parse_cron_field("5,1", 0, 23) == (1, 5)
+    assert FT.parse_cron_field("7", 0, 6) == (0,)  # Sunday
+    for field, low, high in (("60", 0, 59), ("*/0", 0, 59), ("5-1", 0, 23), ("0", 1, 31), ("8", 0, 6)):
+        with pytest.raises(ValueError):
+            FT.parse_cron_field(field, low, high)
+
+
+def test_parse_cron_day_or():
+    assert FT.parse_cron("0 0 13 * 5")[5] is True
+    assert FT.parse_cron("0 0 13 * *")[5] is False
+    assert FT.parse_cron("0 0 * * 5")[5] is False
+    with pytest.raises(ValueError):
+        FT.parse_cron("0 0 * *")
+
+
+def test_next_run_is_strictly_after():
+    cron = FT.parse_cron("*/30 * * * *")
+    assert FT.next_run(cron, local(BERLIN, 2026, 10, 17, 10, 30), BERLIN) == local(BERLIN, 2026, 10, 17, 11, 0)
+    assert FT.next_run(cron, local(BERLIN, 2026, 10, 17, 10, 29), BERLIN) == local(BERLIN, 2026, 10, 17, 10, 30)
+
+
+def test_next_run_rolls_over_year():
+    cron = FT.parse_cron("*/30 * * * *")
+    assert FT.next_run(cron, local(BERLIN, 2026, 12, 31, 23, 45), BERLIN) == local(BERLIN, 2027, 1, 1, 0, 0)
+
+
+def test_next_run_day_or():
+    # 2026-10-17 is a Saturday: Friday the 23rd comes before the 13th of November
+    after = local(BERLIN, 2026, 10, 17, 12, 0)
+    assert FT.next_run(FT.parse_cron("0 0 13 * 5"), after, BERLIN) == local(BERLIN, 2026, 10, 23, 0, 0)
+    assert FT.next_run(FT.parse_cron("0 0 13 * *"), after, BERLIN) == local(BERLIN, 2026, 11, 13, 0, 0)
+    # Both restricted and Friday the 13th: one run, not two
+    assert FT.next_run(FT.parse_cron("0 0 13 * 5"), local(BERLIN, 2026, 11, 12, 12, 0), BERLIN) \
+        == local(BERLIN, 2026, 11, 13, 0, 0)
+
+
+def test_next_run_skips_dst_gap():
+    # 02:30 does not exist on 2026-03-29 in Berlin (clocks jump from 02:00 to 03:00)
+    cron = FT.parse_cron("30 2 * * *")
+    run = FT.next_run(cron, local(BERLIN, 2026, 3, 28, 12, 0), BERLIN)
+    assert run == local(BERLIN, 2026, 3, 30, 2, 30)
+
+
+def test_next_run_ambiguous_time_runs_once():
+    # 02:30 happens twice on 2026-10-25 in Berlin, the run takes the later (standard time) one
+    cron = FT.parse_cron("30 2 * * *")
+    run = FT.next_run(cron, local(BERLIN, 2026, 10, 24, 12, 0), BERLIN)
+    assert run == BERLIN.localize(datetime(2026, 10, 25, 2, 30), is_dst=False)
+    assert FT.next_run(cron, run, BERLIN) == local(BERLIN, 2026, 10, 26, 2, 30)
+
+
+def test_next_run_across_timezones():
+    cron = FT.parse_cron("0 0 * * *")
+    moscow = pytz.timezone("Europe/Moscow")
+    after = pytz.utc.localize(datetime(2026, 10, 17, 20, 59))
+    assert FT.next_run(cron, after, moscow) == pytz.utc.localize(datetime(2026, 10, 17, 21, 0))